@@ -1,3 +1,6 @@
-from .conway_board import ConwayBoard,DEAD,ALIVE
-from .kaggle_example import KaggleExample, create_examples, load_examples, save_examples
+from .conway_board import ConwayBoard,ConwayBoardBatch,advance_many,DEAD,ALIVE
+from .packed_board import PackedConwayBoardBatch,pack_boards,unpack_boards
+from .hashlife import HashLife
+from .kaggle_example import KaggleExample, create_examples, create_example_arrays, iter_examples, iter_example_arrays, examples_from_arrays, load_examples, load_example_arrays, save_examples, error_rates
+from .example_set import ExampleSet, as_example_set, iter_chunks
 from .classifier import Classifier, LocalClassifier, ANNClassifier, FreshEnsembleClassifier, TileClassifier, GlobalClassifier
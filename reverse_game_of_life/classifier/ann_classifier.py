@@ -120,3 +120,12 @@ class ANNClassifier(Classifier):
         predictions[values>self.threshold] = ALIVE
         
         return predictions.reshape(end_board.board.shape)
+
+    def _predict_delta(self,end_boards,delta):
+        ''' Make predictions on a stack of boards, the network is the same for all deltas. '''
+        values = np.array([self.net.activate(board.flatten()) for board in end_boards])
+        predictions = np.zeros(values.shape)
+        predictions.fill(DEAD)
+        predictions[values>self.threshold] = ALIVE
+
+        return predictions.reshape(end_boards.shape)
@@ -3,8 +3,10 @@ import numpy as np
 
 from math import sqrt
 
-from ..conway_board import DEAD,ALIVE
-from ..tools import bootstrap_confidence_interval
+from ..conway_board import ConwayBoard,DEAD,ALIVE
+from ..kaggle_example import error_rates as score_predictions
+from ..example_set import iter_chunks
+from ..tools import RunningStats,bootstrap_confidence_interval,effective_n_jobs,get_shared,parallel_map
 
 class Classifier:
     ''' Default all-dead classifier and super-class for other reverse game of life solutions. 
@@ -27,8 +29,39 @@ class Classifier:
         prediction.fill(DEAD)
         return prediction
 
-    def test(self,examples,verbosity=0,detailed_output=False,output_precision=4,conf_int_method='normal'):
-        '''Evaluate performance on test examples. Returns mean error rate. If
+    def predict_batch(self,end_boards,deltas):
+        '''Returns classifiers predictions for a stack of end boards
+        (num_boards x num_rows x num_cols) and their deltas as a stack of
+        start boards. Boards are grouped by delta and each group is
+        predicted at once by _predict_delta.
+
+        '''
+        end_boards = np.asarray(end_boards)
+        deltas = np.asarray(deltas)
+        predictions = np.empty(end_boards.shape,dtype=int)
+        for delta in np.unique(deltas):
+            at_delta = np.flatnonzero(deltas==delta)
+            predictions[at_delta] = self._predict_delta(end_boards[at_delta],int(delta))
+        return predictions
+
+    def _predict_delta(self,end_boards,delta):
+        '''Predictions for a stack of end boards all with this delta,
+        subclasses override this to predict all boards in one pass, by
+        default predict is called on each board.
+
+        '''
+        return np.array([self.predict(ConwayBoard(board=board.astype(int)),delta) for board in end_boards])
+
+    def predict_examples(self,examples,chunk_size=1000):
+        '''Returns stack of predicted start boards for examples (ExampleSet,
+        list or iterable of KaggleExample), e.g. for save_examples.
+
+        '''
+        return np.concatenate([self.predict_batch(chunk.end_boards,chunk.deltas) for chunk in iter_chunks(examples,chunk_size)])
+
+    def test(self,examples,verbosity=0,detailed_output=False,output_precision=4,conf_int_method='normal',n_jobs=1):
+        '''Evaluate performance on test examples (ExampleSet, list or
+        iterable of KaggleExample). Returns mean error rate. If
         detailed output is True or verbosity>1, displays error rate,
         standard deviation (sd), and 95% confidence interval  for each
         delta.
@@ -42,14 +75,34 @@ class Classifier:
                           'normal' to assume normally distributed error rates 
                           (not actually true) but much faster than bootstrap 
                           and appears to provide similar intervals (default)
+        n_jobs - number of processes to predict with, the classifier is
+                 shared with them copy-on-write rather than pickled,
+                 -1 uses all cpus
 
         '''
         time_start = time.time()
-        total_error_rate = 0
-        delta_counts = dict()
-        delta_error_rates = dict()
-        
-        error_rates = [e.evaluate(self.predict(e.end_board,e.delta)) for e in examples]
+
+        # single pass over chunks so examples can also be a generator such as iter_examples
+        # and per delta stats are accumulated as the chunks are scored
+        keep_values = conf_int_method=='bootstrap' and (verbosity>1 or detailed_output)
+        n_jobs = effective_n_jobs(n_jobs)
+        if n_jobs<=1:
+            results = (_test_chunk((chunk,keep_values),self) for chunk in iter_chunks(examples))
+        else:
+            chunk_size = 1000
+            if hasattr(examples,'__len__'):
+                # at least one chunk per process
+                chunk_size = max(1,min(chunk_size,-(-len(examples)//n_jobs)))
+            results = parallel_map(_test_chunk,[(chunk,keep_values) for chunk in iter_chunks(examples,chunk_size)],n_jobs=n_jobs,shared=self)
+        delta_stats = dict()
+        for chunk_stats in results:
+            for (delta,stats) in chunk_stats.items():
+                if delta not in delta_stats:
+                    delta_stats[delta] = RunningStats(keep_values)
+                delta_stats[delta].merge(stats)
+        all_stats = RunningStats(keep_values)
+        for stats in delta_stats.values():
+            all_stats.merge(stats)
 
         time_end = time.time()            
         if verbosity>0:
@@ -63,36 +116,37 @@ class Classifier:
             data_format = '{0:<7} {1:<7d} {2:<12.'+str(output_precision)+'f} {3:<'+str(output_precision+4)+'.'+str(output_precision)+'f} ({4:.'+str(output_precision)+'f},{5:.'+str(output_precision)+'f})'
             
             print(header_format.format('delta','n','error rate','sd','95% CI'))
-            for delta in sorted(set([e.delta for e in examples])):
-                cur_error_rates = [error_rate for error_rate,example in zip(error_rates,examples) if example.delta==delta]
-               
-
-                mean = sum(cur_error_rates)/len(cur_error_rates)
-                variance = sum([x*x for x in cur_error_rates])/len(cur_error_rates) - mean**2
-                standard_error_mean = sqrt(variance/len(cur_error_rates))
+            for (delta,stats) in sorted(delta_stats.items())+[('all',all_stats)]:
+                standard_error_mean = sqrt(stats.variance/stats.count)
                 if conf_int_method=='normal':
-                    lb = mean-z_value*standard_error_mean
-                    ub = mean+z_value*standard_error_mean
+                    lb = stats.mean-z_value*standard_error_mean
+                    ub = stats.mean+z_value*standard_error_mean
                 elif conf_int_method=='bootstrap':
-                    lb,ub = bootstrap_confidence_interval(cur_error_rates)
+                    lb,ub = bootstrap_confidence_interval(stats.values)
                 else:
                     raise ValueError('Unknown conf_int_method='+str(conf_int_method))
                 
-                print(data_format.format(delta,len(cur_error_rates),mean,sqrt(variance),lb,ub))
-                
-            # overall
-            all_mean = sum(error_rates)/len(error_rates)
-            all_variance = sum([x*x for x in error_rates])/len(error_rates) - all_mean**2
-            all_standard_error_mean = sqrt(all_variance/len(error_rates))
-            if conf_int_method=='normal':
-                lb = all_mean-z_value*all_standard_error_mean
-                ub = all_mean+z_value*all_standard_error_mean
-            elif conf_int_method=='bootstrap':
-                lb,ub = bootstrap_confidence_interval(error_rates)
-            else:
-                raise ValueError('Unknown conf_int_method='+str(conf_int_method))
-                
-            print(data_format.format('all',len(error_rates),all_mean,sqrt(all_variance),lb,ub))
+                print(data_format.format(delta,stats.count,stats.mean,sqrt(stats.variance),lb,ub))
             
 
-        return sum(error_rates)/len(error_rates)
+        return all_stats.mean
+
+
+def _test_chunk(item,classifier=None):
+    '''RunningStats of the error rates for each delta in an (ExampleSet
+    chunk,keep_values) item, by default predicted by the classifier
+    shared with the parallel_map workers.
+
+    '''
+    (chunk,keep_values) = item
+    if classifier is None:
+        classifier = get_shared()
+    if chunk.start_boards is None:
+        raise RuntimeError('Cannot evaluate an example with no start board.')
+    deltas = chunk.deltas
+    error_rates = score_predictions(classifier.predict_batch(chunk.end_boards,deltas),chunk.start_boards)
+    chunk_stats = dict()
+    for delta in np.unique(deltas):
+        chunk_stats[int(delta)] = RunningStats(keep_values)
+        chunk_stats[int(delta)].update(error_rates[deltas==delta])
+    return chunk_stats
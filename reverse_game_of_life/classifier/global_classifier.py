@@ -60,31 +60,37 @@ class GlobalClassifier(Classifier):
                     
     def predict(self,end_board,delta):
         ''' Predict starting board for a single end board and delta. '''
-        num_rows,num_cols = end_board.board.shape
-        
-        y_hat = np.zeros((num_rows,num_cols))
-        counts = np.zeros((num_rows,num_cols))
+        return self.predict_batch(end_board.board[np.newaxis],[delta])[0]
+
+    def _predict_delta(self,end_boards,delta):
+        ''' Predict starting boards for a stack of end boards, one predict_proba call per classifier. '''
+        num_boards,num_rows,num_cols = end_boards.shape
 
+        # feature vectors for all 8 transforms of every board
+        x = np.empty((num_boards,8,num_rows*num_cols),dtype=int)
         for transform in range(8):
-            x = transform_board(end_board.board,transform).reshape((1,num_rows*num_cols))
-            y_cur = np.zeros((num_rows,num_cols))
-            c = np.zeros((num_rows,num_cols))
-            for row in range((num_rows+1)//2):
-                for col in range(row,(num_rows+1)//2):
-                    y_cur[row,col] = self.classifiers[delta][(row,col)].predict_proba(x)[0,1]
-                    c[row,col] += 1
-            y_hat += transform_board(y_cur,inverse_transform(transform))
+            for i in range(num_boards):
+                x[i,transform] = transform_board(end_boards[i],transform).reshape(num_rows*num_cols)
+        x = x.reshape((num_boards*8,num_rows*num_cols))
+
+        y_cur = np.zeros((num_boards*8,num_rows,num_cols))
+        c = np.zeros((num_rows,num_cols))
+        for row in range((num_rows+1)//2):
+            for col in range(row,(num_rows+1)//2):
+                y_cur[:,row,col] = self.classifiers[delta][(row,col)].predict_proba(x)[:,1]
+                c[row,col] += 1
+        y_cur = y_cur.reshape((num_boards,8,num_rows,num_cols))
+
+        y_hat = np.zeros((num_boards,num_rows,num_cols))
+        counts = np.zeros((num_rows,num_cols))
+        for transform in range(8):
+            for i in range(num_boards):
+                y_hat[i] += transform_board(y_cur[i,transform],inverse_transform(transform))
             counts += transform_board(c,inverse_transform(transform))
-            #print('transform='+str(transform))
-            #print('y_hat='+str(y_hat))
-            #print('counts='+str(counts))
 
-        
         y_hat /= counts
-        predictions = np.empty((num_rows,num_cols),dtype=int)
+        predictions = np.empty((num_boards,num_rows,num_cols),dtype=int)
         predictions[...] = DEAD
         predictions[y_hat>0.5] = ALIVE
 
         return predictions
-        
-        
@@ -1,23 +1,90 @@
+import hashlib
+import json
+import os
 import numpy as np
+from numpy.lib.format import open_memmap
 from numpy.lib.stride_tricks import as_strided
 import  time
 
 
-from collections import Counter
 from ..conway_board import DEAD,ALIVE
 from .classifier import Classifier
-from ..kaggle_example import create_examples
-from ..tools import transform_board,inverse_transform
+from ..kaggle_example import iter_example_arrays
+from ..example_set import ExampleSet,as_example_set
+from ..tools import canonicalize_boards,effective_n_jobs,get_shared,inverse_transform,parallel_map,transform_boards
 from sklearn import clone
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.grid_search import ParameterGrid
-from random import shuffle
+
+def _digits_per_byte(base):
+    ''' Number of base digits that fit in a byte without using 0. '''
+    num_digits = 1
+    while base**(num_digits+1)<256:
+        num_digits += 1
+    return num_digits
+
+def _pack_digits(digits,base):
+    '''Pack rows of base digits (2d uint8 array) into one key per row so
+    equal rows have equal keys. Keys are uint64 when the rows fit,
+    otherwise byte strings with several digits per byte. Bytes are
+    offset by 1 since numpy strips trailing null bytes from strings.
+
+    '''
+    (num_rows,num_digits) = digits.shape
+    if base**num_digits<=2**64:
+        powers = np.array([base**i for i in range(num_digits)],dtype=np.uint64)
+        return digits.astype(np.uint64)@powers
+    per_byte = _digits_per_byte(base)
+    num_bytes = -(-num_digits//per_byte)
+    padded = np.zeros([num_rows,num_bytes*per_byte],dtype=np.uint8)
+    padded[:,:num_digits] = digits
+    powers = np.array([base**i for i in range(per_byte)],dtype=np.uint8)
+    packed = padded.reshape(num_rows,num_bytes,per_byte)@powers+np.uint8(1)
+    return np.ascontiguousarray(packed).view('S'+str(num_bytes)).ravel()
+
+def _unpack_digits(keys,base,num_digits):
+    ''' Rows of digits packed by _pack_digits. '''
+    if keys.dtype==np.uint64:
+        digits = np.empty([len(keys),num_digits],dtype=np.uint8)
+        rest = keys.copy()
+        for i in range(num_digits):
+            digits[:,i] = rest%np.uint64(base)
+            rest //= np.uint64(base)
+        return digits
+    per_byte = _digits_per_byte(base)
+    num_bytes = keys.dtype.itemsize
+    packed = np.frombuffer(keys.tobytes(),dtype=np.uint8).reshape(len(keys),num_bytes)-np.uint8(1)
+    digits = np.empty([len(keys),num_bytes,per_byte],dtype=np.uint8)
+    for i in range(per_byte):
+        digits[:,:,i] = (packed//base**i)%base
+    return digits.reshape(len(keys),num_bytes*per_byte)[:,:num_digits]
+
+
+def _search_keys(sorted_keys,keys):
+    ''' (position,found) of keys in sorted_keys, positions of keys that are not found are not meaningful. '''
+    if len(sorted_keys)==0:
+        return (np.zeros(len(keys),dtype=int),np.zeros(len(keys),dtype=bool))
+    position = np.minimum(np.searchsorted(sorted_keys,keys),len(sorted_keys)-1)
+    return (position,sorted_keys[position]==keys)
+
+
+def _train_delta(delta):
+    ''' parallel_map worker for LocalClassifier.train, settings are in the shared tuple. '''
+    (classifier,examples,use_transformations,use_weights,data_dir,estimator_n_jobs) = get_shared()
+    return classifier._train_delta(examples,delta,use_transformations,use_weights,data_dir,estimator_n_jobs)
+
+
+def _score_grid_point(parameters):
+    ''' parallel_map worker for LocalClassifier._score_grid_points, data is in the shared tuple. '''
+    (classifier,(x_train,y_train,w_train),(x_test,y_test,w_test),base_estimator) = get_shared()
+    return classifier._fit_grid_point(x_train,y_train,w_train,x_test,y_test,w_test,base_estimator,parameters)
+
 
 class LocalClassifier(Classifier):
     ''' Predict each cell 1 at a time. '''
 
-    def __init__(self,window_size=1,off_board_value=0,clf=RandomForestClassifier(), test_use_transforms = False, test_threshold = 0.5):
+    def __init__(self,window_size=1,off_board_value=0,clf=RandomForestClassifier(), test_use_transforms = False, test_threshold = 0.5, canonical_windows = False, feature_dtype = np.int8, window_cache_size = 2**16):
         '''
         LocalClassifier constructor.
         window_size is number of cells (in all 4 directions) to include in the features for predicting the center cell.
@@ -25,165 +92,373 @@ class LocalClassifier(Classifier):
         features that are outside the board, defaults to 0 (ie DEAD). Copies of clf will be made and separate
         classifiers used for each unique delta.
         test_use_transforms - if true, uses all 8 board transforms and averages results to predict, uses test_treshold as proba threshold for ALIVE predictions
+        canonical_windows - if true, each window is replaced by its canonical representative under the 8 rotations/flips (see
+        tools.canonicalize_boards) for training and predicting, so use_transformations and test_use_transforms only need 1 pass
+        feature_dtype - numpy dtype of features and labels, the default int8 holds the usual off board values in 1/8 of the
+        memory of float64, must be able to represent off_board_value
+        window_cache_size - max number of windows per delta whose predictions are kept between predict calls, see
+        _predict_windows, 0 only removes duplicate windows within each call
         '''
+        if np.array(off_board_value).astype(feature_dtype)!=off_board_value:
+            raise ValueError('off_board_value='+str(off_board_value)+' can not be represented by feature_dtype='+np.dtype(feature_dtype).name)
         self.window_size = window_size
         self.off_board_value = off_board_value
         self.base_classifier = clf
         self.classifiers = dict()
         self.test_use_transforms = test_use_transforms
         self.test_threshold = test_threshold
+        self.canonical_windows = canonical_windows
+        self.feature_dtype = feature_dtype
+        self.window_cache_size = window_cache_size
+        self.clear_window_cache()
+
+    def __getstate__(self):
+        ''' Pickle without the window cache. '''
+        state = dict(self.__dict__)
+        state.pop('_window_cache',None)
+        return state
+
+    def _add_missing_settings(self):
+        ''' Add settings missing from instances pickled by older versions. '''
+        try:
+            self.test_use_transforms
+        except AttributeError:
+            # old version without test_use_Transforms and test_threshold, so add them
+            self.test_use_transforms = False
+            self.test_threshold = 0.5
+        try:
+            self.canonical_windows
+        except AttributeError:
+            self.canonical_windows = False
+        try:
+            self.feature_dtype
+        except AttributeError:
+            # old versions used float64 features
+            self.feature_dtype = np.float64
+        try:
+            self.window_cache_size
+        except AttributeError:
+            self.window_cache_size = 2**16
+        try:
+            self._compiled_windows
+        except AttributeError:
+            self._compiled_windows = dict()
+        try:
+            self._window_cache
+        except AttributeError:
+            # not pickled, compiled windows are kept
+            self._window_cache = dict()
         
     def _num_features(self):
         ''' Number of features used by this instance to classify each cell. '''
         return (2*self.window_size+1)**2
 
-    def _make_neighbor_features_board(self,board):
+    def _make_neighbor_features_boards(self,boards):
         '''
-        Create features of neighborhood around all cells in board. Returns numpy 2d array of features in row-major
-        order, first row is for (0,0) cell, next row for (0,1) cell, and so on.
+        Create features of neighborhoods around all cells of a stack of boards (num_boards x num_rows x num_cols). The
+        stack is padded once and all windows are taken by a single strided view. Returns numpy 2d array of features,
+        rows for the first board's cells in row-major order first, then the second board's and so on.
         '''
-        # put board in larger 2d array with off board values around the edges so slice notation will grab the neighborhoods
-        square_size = (self.window_size*2+1)
-        embed = np.pad(board, self.window_size, 'constant', constant_values=self.off_board_value) 
-        
-        size = square_size
-        step = 1
-        
-        num_rows,num_cols = embed.shape
-        row_stride, column_stride = embed.strides
+        # put boards in larger arrays with off board values around the edges so slice notation will grab the neighborhoods
+        w = self.window_size
+        size = 2*w+1
+        # in feature_dtype so negative off board values are kept
+        embed = np.pad(np.asarray(boards,dtype=self.feature_dtype), ((0,0),(w,w),(w,w)), 'constant', constant_values=self.off_board_value)
+
+        num_boards,num_rows,num_cols = embed.shape
+        board_stride,row_stride,column_stride = embed.strides
         # populate features
         features = as_strided(
             embed,
-            (int((num_rows - size + 1) / step), int((num_cols - size + 1) / step), size, size),
-            (row_stride * step, column_stride * step, row_stride, column_stride)
+            (num_boards, num_rows - size + 1, num_cols - size + 1, size, size),
+            (board_stride, row_stride, column_stride, row_stride, column_stride)
         )
-        
-        return features.reshape(int(features.size/(size*size)), size*size)
-        
+
+        # the only copy of the windows
+        return features.reshape(-1, size*size)
+
+    def _make_neighbor_features_board(self,board):
+        '''
+        Create features of neighborhood around all cells in board. Returns numpy 2d array of features in row-major
+        order, first row is for (0,0) cell, next row for (0,1) cell, and so on.
+        '''
+        return self._make_neighbor_features_boards(np.asarray(board)[np.newaxis])
+
+    def _make_features_boards(self,boards):
+        ''' Features for all cells of a stack of boards, rows for the first board's cells come first. '''
+        self._add_missing_settings()
+
+        # just use neighborhood features for now
+        features = self._make_neighbor_features_boards(boards)
+        if self.canonical_windows:
+            # the center cell (the label) is the same in all transforms of a window
+            size = 2*self.window_size+1
+            (windows,transforms) = canonicalize_boards(features.reshape(len(features),size,size))
+            features = windows.reshape(len(features),size*size)
+        return features
+
     def _make_features_board(self,board):
         '''
         Create features describing all cells on board. Returns 2d numpy array of features in row-major order, so
         first row is for (0,0), second row for (0,1), etc.
         '''
-        # just use neighborhood features for now
-        return self._make_neighbor_features_board(board)
+        return self._make_features_boards(np.asarray(board)[np.newaxis])
 
     def make_weighted_training_data(self, examples, use_transformations=False):
-        ''' Make training data (x,y,w) from these examples using current settings. Returns weighted data set with no duplicates in (x,y). '''
+        ''' Make training data (x,y,w) from these examples (list of KaggleExample or ExampleSet) using current settings. Returns weighted data set with no duplicates in (x,y). '''
         time_start = time.time()
-        if len(examples)==0:
-            raise ValueError('examples must be non-empty')
-        if examples[0].end_board is None:
-            raise ValueError('all examples must have non-None end_board')
-        
-        num_rows = examples[0].end_board.num_rows
-        num_cols = examples[0].end_board.num_cols
-        
-        copies_per = 1
-        if use_transformations:
-            copies_per = 8
+        (start_boards,end_boards) = self._training_boards(examples)
         
-        data_counter = Counter()
+        copies_per = self._copies_per(use_transformations)
         
-        for example in examples:
-            if example.start_board is None:
-                raise ValueError('all examples must have non-None start_board')
-            if example.end_board is None:
-                raise ValueError('all examples must have non-None end_board')
+        # (window,label) rows are packed into keys and counted with
+        # np.unique, about _group_size rows at a time to bound memory
+        (num_examples,num_rows,num_cols) = end_boards.shape
+        boards_per_group = max(1,self._group_size//(copies_per*num_rows*num_cols))
+        groups = []
+        for first in range(0,num_examples,boards_per_group):
+            keys = []
             for t in range(copies_per):
-                # do transform here to make sure features and labels line up
-                local_board = transform_board(example.end_board.board,t)
-                start_board = transform_board(example.start_board.board,t)
-                
-                local_x = self._make_features_board(local_board)
-                local_y = start_board.flatten()
-                # make tuples for each example and dump into counter
-                data_counter.update([(tuple(features),label) for (features,label) in zip(local_x,local_y)])
-
-        x = np.empty([len(data_counter),self._num_features()])
-        y = np.empty(len(data_counter))
-        w = np.empty(len(data_counter))
-        index = 0
-        for (features,label) in data_counter.keys():
-            x[index] = np.array(features)
-            y[index] = label
-            w[index] = data_counter[(features,label)]
-            index += 1
+                # transform whole stacks so features and labels line up
+                local_x = self._make_features_boards(transform_boards(end_boards[first:first+boards_per_group],t))
+                local_y = transform_boards(start_boards[first:first+boards_per_group],t).reshape(-1)
+                keys.append(self._pack_keys(local_x,local_y))
+            groups.append(np.unique(np.concatenate(keys),return_counts=True))
+
+        if len(groups)==1:
+            (unique_keys,w) = groups[0]
+        else:
+            # merge groups, summing counts of keys found in several
+            (unique_keys,inverse) = np.unique(np.concatenate([group_keys for (group_keys,counts) in groups]),return_inverse=True)
+            w = np.bincount(inverse.ravel(),weights=np.concatenate([counts for (group_keys,counts) in groups]))
+        (x,y) = self._unpack_keys(unique_keys)
+        w = w.astype(float)
 
         time_end = time.time()
         print('training data created in {0} seconds'.format(time_end-time_start))
         return (x,y,w) 
 
+    # number of packed rows collected before they are grouped by make_weighted_training_data
+    _group_size = 2**20
+
+    def _feature_values(self):
+        ''' Sorted array of the values features can take. '''
+        return np.unique([DEAD,ALIVE,self.off_board_value])
+
+    def _feature_digits(self, x, num_digits):
+        ''' Rows of features x as digits (indexes into _feature_values), in the first columns of num_digits. '''
+        values = self._feature_values()
+        # feature value to digit lookup
+        lookup = np.zeros(values[-1]-values[0]+1,dtype=np.uint8)
+        lookup[values-values[0]] = np.arange(len(values))
+        digits = np.empty([len(x),num_digits],dtype=np.uint8)
+        digits[:,:self._num_features()] = lookup[np.asarray(x,dtype=int)-values[0]]
+        return digits
+
+    def _pack_keys(self, x, y):
+        '''Pack rows of features x and labels y into one sortable key per
+        row, see _pack_digits. Reversed by _unpack_keys.
+
+        '''
+        digits = self._feature_digits(x,self._num_features()+1)
+        digits[:,-1] = (y==ALIVE)
+        return _pack_digits(digits,len(self._feature_values()))
+
+    def _pack_windows(self, x):
+        ''' Pack rows of features x into one sortable key per row, like _pack_keys without the labels. '''
+        return _pack_digits(self._feature_digits(x,self._num_features()),len(self._feature_values()))
+
+    def _unpack_windows(self, keys):
+        ''' Features x of keys created by _pack_windows. '''
+        values = self._feature_values()
+        x = np.empty([len(keys),self._num_features()],dtype=self.feature_dtype)
+        x[...] = values[_unpack_digits(keys,len(values),self._num_features())]
+        return x
+
+    def _unpack_keys(self, keys):
+        ''' Features x and labels y of keys created by _pack_keys. '''
+        values = self._feature_values()
+        digits = _unpack_digits(keys,len(values),self._num_features()+1)
+        x = np.empty([len(keys),self._num_features()],dtype=self.feature_dtype)
+        x[...] = values[digits[:,:-1]]
+        y = np.empty(len(keys),dtype=self.feature_dtype)
+        y[...] = DEAD
+        y[digits[:,-1]==1] = ALIVE
+        return (x,y)
+
+    def _training_boards(self, examples):
+        ''' Start and end board stacks of examples, checking they can be used for training. '''
+        self._add_missing_settings()
+        if len(examples)==0:
+            raise ValueError('examples must be non-empty')
+        examples = as_example_set(examples)
+        if examples.start_boards is None:
+            raise ValueError('all examples must have non-None start_board')
+        return (examples.start_boards,examples.end_boards)
+
+    def _copies_per(self, use_transformations):
+        ''' Number of transforms of each example to use for training. '''
+        if use_transformations and not self.canonical_windows:
+            # canonical windows are the same for all transforms
+            return 8
+        return 1
+
+    def _fill_training_data(self, start_boards, end_boards, copies_per, x, y):
+        ''' Write features and labels of these boards into x and y, rows in example, transform, cell order. '''
+        (num_examples,num_rows,num_cols) = end_boards.shape
+        num_cells = num_rows*num_cols
+        x = x.reshape(num_examples,copies_per,num_cells,self._num_features())
+        y = y.reshape(num_examples,copies_per,num_cells)
+        for t in range(copies_per):
+            # transform whole stacks so features and labels line up
+            x[:,t] = self._make_features_boards(transform_boards(end_boards,t)).reshape(num_examples,num_cells,-1)
+            y[:,t] = transform_boards(start_boards,t).reshape(num_examples,num_cells)
+
     def make_training_data(self, examples, use_transformations=False):
-        ''' Make training data (x,y) from these examples using the setting for this LocalClassifier. '''
+        ''' Make training data (x,y) from these examples (list of KaggleExample or ExampleSet) using the setting for this LocalClassifier. '''
         # assume all examples have same size
         time_start = time.time()
-        if len(examples)==0:
-            raise ValueError('examples must be non-empty')
-        if examples[0].end_board is None:
-            raise ValueError('all examples must have non-None end_board')
-        
-        num_rows = examples[0].end_board.num_rows
-        num_cols = examples[0].end_board.num_cols
+        (start_boards,end_boards) = self._training_boards(examples)
         
-        copies_per = 1
-        if use_transformations:
-            copies_per = 8
+        (num_examples,num_rows,num_cols) = end_boards.shape
+        copies_per = self._copies_per(use_transformations)
 
-        x = np.empty([copies_per*num_rows*num_cols*len(examples), self._num_features()])
-        y = np.empty(copies_per*num_rows*num_cols*len(examples))
-        
-        index = 0
-        for example in examples:
-            if example.start_board is None:
-                raise ValueError('all examples must have non-None start_board')
-            if example.end_board is None:
-                raise ValueError('all examples must have non-None end_board')
-            for t in range(copies_per):
-                # do transform here to make sure features and labels line up
-                local_board = transform_board(example.end_board.board,t)
-                start_board = transform_board(example.start_board.board,t)
-                
-                x[index:(index+num_rows*num_cols)] = self._make_features_board(local_board)
-                y[index:(index+num_rows*num_cols)] = start_board.flatten()
-                index += num_rows*num_cols
+        num_rows_x = num_examples*copies_per*num_rows*num_cols
+        x = np.empty([num_rows_x,self._num_features()],dtype=self.feature_dtype)
+        y = np.empty(num_rows_x,dtype=self.feature_dtype)
+        self._fill_training_data(start_boards,end_boards,copies_per,x,y)
 
         time_end = time.time()
         print('training data created in {0} seconds'.format(time_end-time_start))
         return (x,y) 
 
-    def train(self, examples, use_transformations=False,use_weights=True):
+    def _training_data_fingerprint(self, start_boards, end_boards, use_transformations, use_weights):
+        ''' Hash of the boards and every setting that changes the training data made from them. '''
+        settings = {'window_size':self.window_size,'off_board_value':self.off_board_value,
+                    'feature_dtype':np.dtype(self.feature_dtype).str,'canonical_windows':self.canonical_windows,
+                    'copies_per':self._copies_per(use_transformations),'use_weights':use_weights,
+                    'shape':list(end_boards.shape)}
+        fingerprint = hashlib.sha1(json.dumps(settings,sort_keys=True).encode())
+        fingerprint.update(np.ascontiguousarray(start_boards,dtype=np.uint8))
+        fingerprint.update(np.ascontiguousarray(end_boards,dtype=np.uint8))
+        return fingerprint.hexdigest()
+
+    def make_training_shards(self, examples, data_dir, name='data', use_transformations=False, use_weights=True, chunk_size=1000):
+        '''Make training data like make_weighted_training_data (use_weights) or make_training_data, but write it
+        to .npy files data_dir/name.x.npy, name.y.npy (and name.w.npy) and return them memory-mapped. Unweighted data
+        is built chunk_size examples at a time so it never has to fit in memory. The files are reused by later calls
+        with the same examples and settings, e.g. by train and tune_and_train or across experiments.
+
+        Returns (x,y,w), w is None if use_weights is False.
+        '''
+        time_start = time.time()
+        (start_boards,end_boards) = self._training_boards(examples)
+        fingerprint = self._training_data_fingerprint(start_boards,end_boards,use_transformations,use_weights)
+
+        names = ['x','y','w'] if use_weights else ['x','y']
+        paths = dict([(n,os.path.join(data_dir,name+'.'+n+'.npy')) for n in names])
+        info_path = os.path.join(data_dir,name+'.json')
+        try:
+            with open(info_path) as f:
+                reuse = json.load(f)['fingerprint']==fingerprint and all([os.path.exists(path) for path in paths.values()])
+        except (IOError,OSError,ValueError,KeyError):
+            reuse = False
+
+        if not reuse:
+            if not os.path.isdir(data_dir):
+                os.makedirs(data_dir)
+            if os.path.exists(info_path):
+                # stale until the new data is complete
+                os.remove(info_path)
+            if use_weights:
+                # already deduplicated a group at a time, so only the unique rows are in memory
+                for (n,a) in zip(names,self.make_weighted_training_data(examples,use_transformations=use_transformations)):
+                    np.save(paths[n],a)
+            else:
+                (num_examples,num_rows,num_cols) = end_boards.shape
+                copies_per = self._copies_per(use_transformations)
+                rows_per = copies_per*num_rows*num_cols
+                x = open_memmap(paths['x'],mode='w+',dtype=self.feature_dtype,shape=(num_examples*rows_per,self._num_features()))
+                y = open_memmap(paths['y'],mode='w+',dtype=self.feature_dtype,shape=(num_examples*rows_per,))
+                for first in range(0,num_examples,chunk_size):
+                    last = min(num_examples,first+chunk_size)
+                    self._fill_training_data(start_boards[first:last],end_boards[first:last],copies_per,
+                                             x[first*rows_per:last*rows_per],y[first*rows_per:last*rows_per])
+                x.flush()
+                y.flush()
+                del x,y
+            with open(info_path,'w') as f:
+                json.dump({'fingerprint':fingerprint},f)
+            print('training shards {0} created in {1} seconds'.format(name,time.time()-time_start))
+
+        data = [np.load(paths[n],mmap_mode='r') for n in names]
+        if not use_weights:
+            data.append(None)
+        return tuple(data)
+
+    def _training_data(self, examples, use_transformations, use_weights, data_dir=None, name='data'):
+        ''' Training data (x,y,w) in memory, or memory-mapped from shards in data_dir. w is None if use_weights is False. '''
+        if data_dir is not None:
+            return self.make_training_shards(examples,data_dir,name,use_transformations=use_transformations,use_weights=use_weights)
+        if use_weights:
+            return self.make_weighted_training_data(examples,use_transformations=use_transformations)
+        (x,y) = self.make_training_data(examples,use_transformations=use_transformations)
+        return (x,y,None)
+
+    def train(self, examples, use_transformations=False,use_weights=True,data_dir=None,n_jobs=1):
+        '''Train a classifier for each delta in examples (list of KaggleExample or ExampleSet).
+
+        data_dir - if set, training data for each delta is kept in memory-mapped shards there, see make_training_shards
+        n_jobs - number of processes to use, deltas are trained concurrently (up to one process each) and the rest of
+                 the budget goes to the estimator's own n_jobs if it has one, -1 uses all cpus
+        '''
         time_start = time.time()
 
         self.classifiers = dict()
+        self.clear_window_cache()
         
-        deltas = set([e.delta for e in examples])
-        
-        for delta in deltas:
-            # create classifier with same params as base classifier
-            clf = clone(self.base_classifier)
-            
-            if use_weights:
-                # weighted training data for current delta
-                # training data for current delta            
-                (train_x,train_y,train_w) = self.make_weighted_training_data([e for e in examples if e.delta==delta],use_transformations=use_transformations) 
-                print ('delta={0}, training with {1} weighted examples'.format(delta,len(train_x)))
-                # fit
-                clf.fit(train_x,train_y,train_w)
+        examples = as_example_set(examples)
+        deltas = examples.unique_deltas()
 
-            else:
-                # training data for current delta            
-                (train_x,train_y) = self.make_training_data([e for e in examples if e.delta==delta],use_transformations=use_transformations)            
-                print ('delta={0}, training with {1} examples'.format(delta,len(train_x)))
-                # fit
-                clf.fit(train_x,train_y)
+        n_jobs = effective_n_jobs(n_jobs)
+        num_workers = min(n_jobs,len(deltas))
+        estimator_n_jobs = None
+        if n_jobs>1 and 'n_jobs' in self.base_classifier.get_params():
+            # cpus not used by delta level workers go to the estimator
+            estimator_n_jobs = max(1,n_jobs//num_workers)
 
-            # store
-            self.classifiers[delta] = clf
+        # examples and settings are shared with the workers copy-on-write
+        shared = (self,examples,use_transformations,use_weights,data_dir,estimator_n_jobs)
+        classifiers = parallel_map(_train_delta,deltas,n_jobs=num_workers,shared=shared)
+        self.classifiers = dict(zip(deltas,classifiers))
 
         time_end = time.time()
         print('training completed in {0} seconds'.format(time_end-time_start))
 
+    def _train_delta(self, examples, delta, use_transformations, use_weights, data_dir=None, estimator_n_jobs=None):
+        ''' Fit a copy of the base classifier to the examples with this delta. '''
+        # create classifier with same params as base classifier
+        clf = clone(self.base_classifier)
+        if estimator_n_jobs is not None:
+            clf.set_params(n_jobs=estimator_n_jobs)
+        
+        # training data for current delta
+        (train_x,train_y,train_w) = self._training_data(examples.for_delta(delta),use_transformations,use_weights,data_dir,'delta{0}'.format(delta))
+        if use_weights:
+            print ('delta={0}, training with {1} weighted examples'.format(delta,len(train_x)))
+            # fit
+            clf.fit(train_x,train_y,train_w)
+
+        else:
+            print ('delta={0}, training with {1} examples'.format(delta,len(train_x)))
+            # fit
+            clf.fit(train_x,train_y)
+
+        if estimator_n_jobs is not None:
+            # predict with the n_jobs the base classifier asked for
+            clf.set_params(n_jobs=self.base_classifier.get_params()['n_jobs'])
+        return clf
+
     def _score(self,clf,x,y,w=None):
         '''General score function to handle weighted or unweighted examples,
         returns accuracy.
@@ -214,7 +489,78 @@ class LocalClassifier(Classifier):
             
         return score,parameters
 
-    def tune_and_train(self, examples, param_grid, use_transformations=False, use_weights=True,tune_perc=0.5,verbosity=0):
+    def _score_grid_points(self, points, train_data, test_data, n_jobs=1):
+        '''(score,parameters) of each grid point fit to train_data (x,y,w) and scored on test_data, using up to
+        n_jobs processes that share the data copy-on-write.
+
+        '''
+        n_jobs = effective_n_jobs(n_jobs)
+        num_workers = min(n_jobs,len(points))
+        base_estimator = self.base_classifier
+        if n_jobs>1 and 'n_jobs' in base_estimator.get_params():
+            # cpus not used by grid point workers go to the estimator
+            base_estimator = clone(base_estimator).set_params(n_jobs=max(1,n_jobs//num_workers))
+        shared = (self,train_data,test_data,base_estimator)
+        return parallel_map(_score_grid_point,points,n_jobs=num_workers,shared=shared)
+
+    def _search_grid(self, points, train_data, test_data, n_jobs=1, abandon_margin=None, verbosity=0, seed=None):
+        '''(score,parameters) of grid points, abandoning clearly worse points after a first fit to 1/4 of train_data if
+        abandon_margin is set, see _subset_data.
+
+        '''
+        if abandon_margin is not None and len(points)>1:
+            subset = self._subset_data(train_data,4,seed)
+            first_scores = self._score_grid_points(points,subset,test_data,n_jobs)
+            best_score = max([score for (score,parameters) in first_scores])
+            points = [parameters for (score,parameters) in first_scores if score>=best_score-abandon_margin]
+            if verbosity>1:
+                print('abandoned {0} of {1} grid points'.format(len(first_scores)-len(points),len(first_scores)))
+        return self._score_grid_points(points,train_data,test_data,n_jobs)
+
+    def _search_halving(self, points, train_data, test_data, n_jobs=1, halving_factor=3, verbosity=0, seed=None):
+        '''(score,parameters) of the grid points that survive successive halving. All points are fit to a
+        1/halving_factor**k subset of train_data, the best 1/halving_factor of them move on to a subset
+        halving_factor times larger, until at most halving_factor points are fit to all of train_data.
+
+        '''
+        num_rungs = 0
+        while len(points)>halving_factor**(num_rungs+1):
+            num_rungs += 1
+        for rung in range(num_rungs,0,-1):
+            subset = self._subset_data(train_data,halving_factor**rung,seed)
+            scores = sorted(self._score_grid_points(points,subset,test_data,n_jobs),key=lambda x:x[0],reverse=True)
+            num_kept = int(np.ceil(len(points)/halving_factor))
+            points = [parameters for (score,parameters) in scores[0:num_kept]]
+            if verbosity>1:
+                print('kept {0} of {1} grid points after fitting to 1/{2} of the data'.format(num_kept,len(scores),halving_factor**rung))
+        return self._score_grid_points(points,train_data,test_data,n_jobs)
+
+    def _subset_data(self, data, step, seed=None):
+        '''About 1/step of data (x,y,w). Unweighted rows are in example
+        order so the leading rows (views, memory-mapped shards are not
+        read in full) are a subset of the examples. Weights are counts of
+        (window,label) rows, each counted row is kept with probability
+        1/step so the subset has about 1/step of the weight with the same
+        mix of windows and labels.
+
+        '''
+        (x,y,w) = data
+        if w is None:
+            num_rows = max(1,len(x)//step)
+            return (x[0:num_rows],y[0:num_rows],None)
+        counts = np.random.default_rng(seed).binomial(np.round(w).astype(np.int64),1/step)
+        kept = np.flatnonzero(counts)
+        return (x[kept],y[kept],counts[kept].astype(float))
+
+    def _merge_weighted_data(self, *data):
+        ''' Merge weighted data sets (x,y,w) into one, summing the weights of rows found in several. '''
+        keys = np.concatenate([self._pack_keys(x,y) for (x,y,w) in data])
+        (unique_keys,inverse) = np.unique(keys,return_inverse=True)
+        w = np.bincount(inverse.ravel(),weights=np.concatenate([w for (x,y,w) in data]))
+        (x,y) = self._unpack_keys(unique_keys)
+        return (x,y,w)
+
+    def tune_and_train(self, examples, param_grid, use_transformations=False, use_weights=True,tune_perc=0.5,verbosity=0,data_dir=None,seed=None,n_jobs=1,abandon_margin=None,search='grid',halving_factor=3):
         '''Tune parameters and then train using best parameters. 
 
         param_grid - list of dicts with setting configurations to try,
@@ -222,37 +568,71 @@ class LocalClassifier(Classifier):
         
         tune_perc - percentage of examples to use for tuning
 
+        data_dir - if set, training data is kept in memory-mapped shards
+        there, see make_training_shards
+
+        seed - int for a reproducible tuning split, also lets shards in
+        data_dir be reused by later calls
+
+        n_jobs - number of processes to fit grid points with, the
+        training data is shared with them copy-on-write (or through the
+        memory-mapped shards), -1 uses all cpus
+
+        abandon_margin - if set, grid points are first fit to 1/4 of
+        the tuning data and those with accuracy more than abandon_margin
+        below the best are abandoned, only the rest are in grid_scores
+
+        search - 'grid' fits every grid point to all of the tuning data,
+        'halving' uses successive halving: every point is fit to a small
+        subset of the tuning data and only the best 1/halving_factor of
+        them are fit again to a subset halving_factor times larger, only
+        the points fit to all of the tuning data are in grid_scores
+
+        examples can be a list of KaggleExample or an ExampleSet.
         '''
 
+        if search not in ('grid','halving'):
+            raise ValueError("search must be 'grid' or 'halving', got "+repr(search))
+        if search=='halving' and halving_factor<2:
+            raise ValueError('halving_factor must be at least 2')
+
         time_start = time.time()
         
         self.classifiers = dict()
+        self.clear_window_cache()
         self.grid_scores = dict()
         self.best_scores = dict()
         self.best_params = dict()
         
-        deltas = set([e.delta for e in examples])
+        examples = as_example_set(examples)
+        deltas = examples.unique_deltas()
         
         for delta in deltas:
-            cur_examples = [e for e in examples if e.delta==delta]
+            # random ordering
+            cur_examples = examples.for_delta(delta).shuffle(seed)
             
             # train/test split
             cutoff = int(len(cur_examples)*tune_perc)
-            # random ordering
-            shuffle(cur_examples)
             
+            # featurize once, the final fit reuses the tuning data
             if use_weights:
-                (x_train,y_train,w_train) = self.make_weighted_training_data(cur_examples[0:cutoff],use_transformations=use_transformations)
-                (x_test,y_test,w_test) = self.make_weighted_training_data(cur_examples[cutoff:len(examples)],use_transformations=use_transformations)
+                train_data = self._training_data(cur_examples[0:cutoff],use_transformations,use_weights,data_dir,'delta{0}_tune'.format(delta))
+                test_data = self._training_data(cur_examples[cutoff:len(cur_examples)],use_transformations,use_weights,data_dir,'delta{0}_validate'.format(delta))
+                all_data = self._merge_weighted_data(train_data,test_data)
             else:
-                (x_train,y_train) = self.make_training_data(cur_examples[0:cutoff],use_transformations=use_transformations)
-                (x_test,y_test) = self.make_training_data(cur_examples[cutoff:len(examples)],use_transformations=use_transformations)
-                w_test = None
-                w_train = None
+                # rows are in example order so the split is a slice
+                all_data = self._training_data(cur_examples,use_transformations,use_weights,data_dir,'delta{0}_shuffled'.format(delta))
+                split = cutoff*(len(all_data[0])//len(cur_examples))
+                train_data = (all_data[0][0:split],all_data[1][0:split],None)
+                test_data = (all_data[0][split:],all_data[1][split:],None)
                                         
             # fit each parameter setting using ParameterGrid from
             # sklearn.grid_search to cycle through the possibilities
-            self.grid_scores[delta] = [self._fit_grid_point(x_train,y_train,w_train,x_test,y_test,w_test,self.base_classifier,parameters) for parameters in ParameterGrid(param_grid)]
+            points = list(ParameterGrid(param_grid))
+            if search=='halving':
+                self.grid_scores[delta] = self._search_halving(points,train_data,test_data,n_jobs,halving_factor,verbosity,seed)
+            else:
+                self.grid_scores[delta] = self._search_grid(points,train_data,test_data,n_jobs,abandon_margin,verbosity,seed)
 
             (best_scores,best_params) = sorted(self.grid_scores[delta],key=lambda x:x[0], reverse=True)[0]
             if verbosity>1:
@@ -265,11 +645,10 @@ class LocalClassifier(Classifier):
             clf = clone(self.base_classifier)
             clf.set_params(**best_params)
             
+            (x,y,w) = all_data
             if use_weights:
-                (x,y,w) = self.make_weighted_training_data(cur_examples,use_transformations=use_transformations)
                 clf.fit(x,y,w)
             else:
-                (x,y) = self.make_training_data(cur_examples,use_transformations=use_transformations)
                 clf.fit(x,y)
                 
             # store
@@ -280,40 +659,237 @@ class LocalClassifier(Classifier):
             print('tuning and training completed in {0} seconds'.format(time_end-time_start))
         
     def predict(self,end_board, delta):
-        if delta not in self.classifiers:
-            raise ValueError('Unable to predict delta='+str(delta)+', no training data for that delta')
+        ''' Returns prediction for ConwayBoard and given delta. '''
+        return self.predict_batch(end_board.board[np.newaxis],[delta])[0]
 
-        try:
-            self.test_use_transforms
-        except AttributeError:
-            # old version without test_use_Transforms and test_threshold, so add them
-            self.test_use_transforms = False
-            self.test_threshold = 0.5
-            
+    def clear_window_cache(self):
+        '''Drop the window predictions kept by _predict_windows and the
+        windows compiled by compile, needed if classifiers are changed by
+        hand.
+
+        '''
+        self._window_cache = dict()
+        self._compiled_windows = dict()
+
+    def _window_scorer(self,delta,name):
+        ''' Function scoring rows of features with the classifier for delta, 'predict' gives labels and 'proba' the probability of ALIVE. '''
         clf = self.classifiers[delta]
+        if name=='proba':
+            return lambda x:clf.predict_proba(x)[:,1]
+        return clf.predict
+
+    def _window_score_names(self):
+        ''' Names of the scores _predict_delta asks _predict_windows for with the current settings. '''
+        return ['proba'] if self.test_use_transforms else ['predict']
+
+    def _predict_windows(self,x,delta,name):
+        '''Score (see _window_scorer) of each row of features x, computed
+        once for each unique window. Windows compiled by compile are
+        looked up, others are kept for up to window_cache_size windows
+        per delta and name, so windows seen in earlier calls (like the
+        all dead and border windows) are not scored again. The least
+        frequently seen windows are evicted first.
+
+        '''
+        compiled = self._compiled_windows.get((delta,name))
+        if compiled is not None and compiled[0]=='table':
+            # every possible window is in the table
+            return compiled[1][self._window_indexes(x)]
+
+        (keys,first,inverse,counts) = np.unique(self._pack_windows(x),return_index=True,return_inverse=True,return_counts=True)
+        inverse = inverse.ravel()
+        # (which keys,their values) from the compiled windows, the cache and the classifier
+        parts = []
+        known = np.zeros(len(keys),dtype=bool)
+        if compiled is not None:
+            (position,found) = _search_keys(compiled[1],keys)
+            parts.append((found,compiled[2][position[found]]))
+            known |= found
+        cache = self._window_cache.get((delta,name))
+        if cache is not None:
+            (cache_keys,cache_values,cache_counts) = cache
+            (position,in_cache) = _search_keys(cache_keys,keys)
+            in_cache &= ~known
+            parts.append((in_cache,cache_values[position[in_cache]]))
+            known |= in_cache
+        missing = ~known
+        if missing.any() or len(parts)==0:
+            new_values = self._window_scorer(delta,name)(x[first[missing]])
+            parts.append((missing,new_values))
+        values = np.empty(len(keys),dtype=np.result_type(*[part for (found,part) in parts]))
+        for (found,part) in parts:
+            values[found] = part
+
+        if self.window_cache_size>0 and missing.any():
+            if cache is None:
+                (cache_keys,cache_values,cache_counts) = (keys[missing],values[missing],counts[missing])
+            else:
+                # count hits, add the new windows keeping keys sorted
+                cache_counts = cache_counts.copy()
+                cache_counts[position[in_cache]] += counts[in_cache]
+                order = np.argsort(np.concatenate([cache_keys,keys[missing]]),kind='stable')
+                cache_keys = np.concatenate([cache_keys,keys[missing]])[order]
+                cache_values = np.concatenate([cache_values,values[missing]])[order]
+                cache_counts = np.concatenate([cache_counts,counts[missing]])[order]
+            if len(cache_keys)>self.window_cache_size:
+                # keep the most frequent, still in key order
+                kept = np.sort(np.argpartition(-cache_counts,self.window_cache_size-1)[:self.window_cache_size])
+                (cache_keys,cache_values,cache_counts) = (cache_keys[kept],cache_values[kept],cache_counts[kept])
+            self._window_cache[(delta,name)] = (cache_keys,cache_values,cache_counts)
+        elif cache is not None:
+            # only hits, just count them
+            cache_counts[position[in_cache]] += counts[in_cache]
+
+        return values[inverse]
+
+    def _num_border_classes(self):
+        '''Number of ways the window can hang off the edges of the board,
+        1 if off board cells look like DEAD or ALIVE cells.
+
+        '''
+        if self.off_board_value in (DEAD,ALIVE):
+            return 1
+        return (self.window_size+1)**4
+
+    def _window_indexes(self,x):
+        '''Index of each row of features x in a compiled table, border
+        class times 2**num_features plus a bit per ALIVE cell. The border
+        class counts the off board cells above, below, left and right of
+        the center, which fixes all the off board cells of a window.
 
-        (num_rows,num_cols) = end_board.board.shape
+        '''
+        w = self.window_size
+        size = 2*w+1
+        bits = (np.asarray(x)==ALIVE).astype(np.int64)@(np.int64(1)<<np.arange(size*size,dtype=np.int64))
+        if self._num_border_classes()==1:
+            return bits
+        off = (np.asarray(x)==self.off_board_value).reshape(len(x),size,size)
+        border = np.zeros(len(x),dtype=np.int64)
+        for counts in (off[:,0:w,w],off[:,w+1:,w],off[:,w,0:w],off[:,w,w+1:]):
+            border = border*(w+1)+counts.sum(axis=1)
+        return (border<<(size*size))+bits
+
+    def _all_windows(self):
+        '''(features,table indexes) of every window that can be made from a
+        board, off board cells all hang off the edges (see
+        _window_indexes). Windows are generated about _group_size at a
+        time so large tables never need all of them in memory.
+
+        '''
+        w = self.window_size
+        size = 2*w+1
+        (rows,cols) = np.indices([size,size])
+        for border in range(self._num_border_classes()):
+            if self._num_border_classes()==1:
+                off = np.zeros([size,size],dtype=bool)
+            else:
+                (top,bottom,left,right) = [(border//(w+1)**i)%(w+1) for i in (3,2,1,0)]
+                off = (rows<top)|(rows>=size-bottom)|(cols<left)|(cols>=size-right)
+            on_cells = np.flatnonzero(~off.ravel())
+            for start in range(0,2**len(on_cells),self._group_size):
+                # bit j of a pattern is the j-th on board cell
+                patterns = np.arange(start,min(start+self._group_size,2**len(on_cells)),dtype=np.int64)
+                x = np.empty([len(patterns),size*size],dtype=self.feature_dtype)
+                x[...] = self.off_board_value
+                indexes = np.empty(len(patterns),dtype=np.int64)
+                indexes[...] = np.int64(border)<<(size*size)
+                for (j,cell) in enumerate(on_cells):
+                    alive = ((patterns>>j)&1)==1
+                    x[:,cell] = DEAD
+                    x[alive,cell] = ALIVE
+                    indexes[alive] += np.int64(1)<<np.int64(cell)
+                yield (x,indexes)
+
+    def compile(self,examples=None,max_table_size=2**22,verbosity=0):
+        '''Score every window once so predicting is a lookup instead of a
+        classifier call, for each delta and the current prediction
+        settings (test_use_transforms).
+
+        Small windows (eg window_size=1) are compiled to a table with an
+        entry for every possible window if that is at most
+        max_table_size entries. Otherwise the windows of examples' end
+        boards (list of KaggleExample or ExampleSet, eg the test set) are
+        compiled, windows not in them are scored by the classifier as
+        usual. Compiled windows are dropped by train and
+        clear_window_cache.
+
+        '''
+        time_start = time.time()
+        self._add_missing_settings()
+        size = 2*self.window_size+1
+        table_size = self._num_border_classes()*2**(size*size)
+        if table_size>max_table_size and examples is None:
+            raise ValueError('{0} windows do not fit in max_table_size={1}, examples are needed'.format(table_size,max_table_size))
+        if examples is not None:
+            examples = as_example_set(examples)
+
+        for delta in self.classifiers:
+            for name in self._window_score_names():
+                score = self._window_scorer(delta,name)
+                if table_size<=max_table_size:
+                    table = None
+                    for (x,indexes) in self._all_windows():
+                        values = score(x)
+                        if table is None:
+                            table = np.zeros(table_size,dtype=values.dtype)
+                        table[indexes] = values
+                    self._compiled_windows[(delta,name)] = ('table',table)
+                elif delta in examples.unique_deltas():
+                    end_boards = examples.for_delta(delta).end_boards
+                    transforms = [0] if name=='predict' or self.canonical_windows else list(range(8))
+                    keys = np.unique(np.concatenate([self._pack_windows(self._make_features_boards(transform_boards(end_boards,t))) for t in transforms]))
+                    x = self._unpack_windows(keys)
+                    values = np.concatenate([score(x[start:start+self._group_size]) for start in range(0,len(x),self._group_size)])
+                    self._compiled_windows[(delta,name)] = ('keys',keys,values)
+                if verbosity>1 and (delta,name) in self._compiled_windows:
+                    print('delta={0}: compiled {1} windows'.format(delta,len(self._compiled_windows[(delta,name)][-1])))
+
+        # windows in the cache are now answered by the compiled windows
+        self._window_cache = dict()
+        time_end = time.time()
+        if verbosity>0:
+            print('compiled in {0:.1f} seconds'.format(time_end-time_start))
+
+    def _predict_proba_transforms(self,end_boards,delta,transforms):
+        '''Probability that each cell of a stack of end boards is ALIVE,
+        averaged over the transforms of the boards. Transforms giving
+        boards of the same shape are stacked and featurized together, so
+        there is one predict_proba call per board shape (at most 2) for
+        about _group_size rows instead of one call per transform.
+
+        '''
+        y_hat = np.zeros(end_boards.shape)
+        by_shape = dict()
+        for t in transforms:
+            by_shape.setdefault(transform_boards(end_boards[0:1],t).shape[1:],[]).append(t)
+
+        for (shape,shape_transforms) in by_shape.items():
+            boards_per_group = max(1,self._group_size//(len(shape_transforms)*shape[0]*shape[1]))
+            for start in range(0,len(end_boards),boards_per_group):
+                boards = end_boards[start:start+boards_per_group]
+                stacked = np.concatenate([transform_boards(boards,t) for t in shape_transforms])
+                y_cur = self._predict_windows(self._make_features_boards(stacked),delta,'proba')
+                y_cur = y_cur.reshape((len(shape_transforms),len(boards))+shape)
+                # add to predictions, but transform back to original boards
+                for (i,t) in enumerate(shape_transforms):
+                    y_hat[start:start+len(boards)] += transform_boards(y_cur[i],inverse_transform(t))
+
+        return y_hat/len(transforms)
+
+    def _predict_delta(self,end_boards,delta):
+        ''' Predict a stack of end boards with one classifier call (per transform) for all their cells. '''
+        if delta not in self.classifiers:
+            raise ValueError('Unable to predict delta='+str(delta)+', no training data for that delta')
+
+        self._add_missing_settings()
 
         if self.test_use_transforms:
-            # predict on all 8 transforms of board and average the probabilities
-            y_hat = np.zeros((num_rows,num_cols))
-
-            for t in range(8):
-                #temp_array = np.array(transform_board(end_board.board,t))
-                x = self._make_features_board(transform_board(end_board.board,t))
-                #print('x.shape='+str(x.shape))
-                y_cur = clf.predict_proba(x)[:,1]
-                #y_cur = y_cur[:,1] # grab second column, probs for the positive (1) class
-                #print('y_cur.shape=',str(y_cur.shape))
-                y_cur = y_cur.reshape((num_rows,num_cols))
-                #print('y_cur.shape=',str(y_cur.shape))
-                # add to predictions, but transform back to original board
-                y_add = transform_board(y_cur,inverse_transform(t))
-                #print('y_add.shape=',str(y_add.shape))
-                y_hat = y_hat+0.125*y_add
-                
+            # predict on all 8 transforms of boards and average the probabilities,
+            # canonical windows are the same for all transforms so 1 is enough
+            transforms = [0] if self.canonical_windows else list(range(8))
+            y_hat = self._predict_proba_transforms(end_boards,delta,transforms)
 
-            predictions = np.empty((num_rows,num_cols),dtype=int)
+            predictions = np.empty(end_boards.shape,dtype=int)
             predictions[...] = DEAD
             predictions[y_hat>self.test_threshold] = ALIVE
 
@@ -321,51 +897,54 @@ class LocalClassifier(Classifier):
         
         else:
             # make all cell predictions at once (row-major order)
-            x = np.empty([num_rows*num_cols,self._num_features()])
-            # populate x
-            x = self._make_features_board(end_board.board)
+            x = self._make_features_boards(end_boards)
             
-            # predict
-            y_hat = clf.predict(x)
+            # predict each unique window once
+            y_hat = self._predict_windows(x,delta,'predict')
             
-            # reshape into board
-            predictions = y_hat.reshape((num_rows,num_cols))
-            return predictions
+            # reshape into boards
+            return y_hat.reshape(end_boards.shape)
 
 
 
 class FreshEnsembleClassifier(LocalClassifier):
     ''' Generate new examples for every tree in the forest. '''
     
-    def __init__(self,window_size=1,off_board_value=0,clf=DecisionTreeClassifier(),n_estimators=10):
+    def __init__(self,window_size=1,off_board_value=0,clf=DecisionTreeClassifier(),n_estimators=10,canonical_windows=False,feature_dtype=np.int8,window_cache_size=2**16):
         # superclass constructor
-        LocalClassifier.__init__(self,window_size=window_size,off_board_value=off_board_value,clf=clf)
+        LocalClassifier.__init__(self,window_size=window_size,off_board_value=off_board_value,clf=clf,canonical_windows=canonical_windows,feature_dtype=feature_dtype,window_cache_size=window_cache_size)
         self.n_estimators=n_estimators
         
         
-    def train(self,num_examples,deltas=list(range(1,6)),use_transformations=False,use_weights=True,verbosity=0):
+    def train(self,num_examples,deltas=list(range(1,6)),use_transformations=False,use_weights=True,verbosity=0,seed=None):
         '''Train ensemble of classifiers using newly generated data for every
-        member of the ensemble.
+        member of the ensemble. Examples are streamed so only one
+        member's examples are in memory at a time.
 
+        seed - int for reproducible training examples
         '''
         time_start = time.time()
         
         self.classifiers = dict()
+        self.clear_window_cache()
 
-        for delta in deltas:
+        for (delta_index,delta) in enumerate(deltas):
             self.classifiers[delta] = [] # list for ensemble of classifiers
+            # endless stream of examples for this delta, one chunk per member
+            stream = iter_example_arrays(chunk_size=num_examples,deltas=[delta],seed=seed,worker_index=delta_index,num_workers=len(deltas))
             for i in range(self.n_estimators):
                 # base classifier
                 clf = clone(self.base_classifier)
+                examples = ExampleSet(*next(stream))
                 
                 if use_weights:
-                    train_x,train_y,train_w = self.make_weighted_training_data(create_examples(num_examples=num_examples,deltas=[delta]),use_transformations=use_transformations)
+                    train_x,train_y,train_w = self.make_weighted_training_data(examples,use_transformations=use_transformations)
                     if verbosity>1:
                         print ('delta={0}, #{1}: training with {2} weighted examples'.format(delta,i,len(train_x)))
                     # fit
                     clf.fit(train_x,train_y,sample_weight=train_w)
                 else:
-                    train_x,train_y = self.make_training_data(create_examples(num_examples=num_examples,deltas=[delta]),use_transformations=use_transformations)
+                    train_x,train_y = self.make_training_data(examples,use_transformations=use_transformations)
                     if verbosity>1:
                         print ('delta={0}, #{1}: training with {2} examples'.format(delta,i,len(train_x)))
                     clf.fit(train_x,train_y)
@@ -378,23 +957,29 @@ class FreshEnsembleClassifier(LocalClassifier):
 
             
 
-    def predict(self,end_board,delta):
+    def _predict_delta(self,end_boards,delta):
         if delta not in self.classifiers:
             raise ValueError('Unable to predict delta='+str(delta)+', no classifiers for that delta')
 
         
         # make all predictions at once (row-major order)
-        x = self._make_features_board(end_board.board)
-        
-        predictions = np.zeros([len(x),2])
-        
-        for clf in self.classifiers[delta]:
-            predictions += clf.predict_proba(x)
-            
-        ret = np.empty(len(predictions))
-        ret[...] = DEAD # default to all dead        
-        ret[predictions[:,0]<predictions[:,1]] = ALIVE # grab alive predictions
-        
-        return ret.reshape(end_board.board.shape)
-
-                
+        x = self._make_features_boards(end_boards)
+
+        # each unique window is voted on once
+        return self._predict_windows(x,delta,'predict').reshape(end_boards.shape)
+
+    def _window_scorer(self,delta,name):
+        ''' Function giving the majority vote of the ensemble for delta on rows of features. '''
+        def vote(x):
+            predictions = np.zeros([len(x),2])
+            for clf in self.classifiers[delta]:
+                predictions += clf.predict_proba(x)
+            ret = np.empty(len(predictions))
+            ret[...] = DEAD # default to all dead
+            ret[predictions[:,0]<predictions[:,1]] = ALIVE # grab alive predictions
+            return ret
+        return vote
+
+    def _window_score_names(self):
+        ''' The ensemble always votes, test_use_transforms is not used. '''
+        return ['predict']
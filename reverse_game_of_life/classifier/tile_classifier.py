@@ -1,4 +1,5 @@
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 from .classifier import Classifier
 from ..conway_board import ALIVE,DEAD
@@ -46,6 +47,11 @@ class TileClassifier(Classifier):
     
 
     def predict(self,end_board,delta):
+        ''' Predict starting board for a single end board and delta. '''
+        return self.predict_batch(end_board.board[np.newaxis],[delta])[0]
+
+    def _predict_board(self,end_board,delta):
+        ''' Predict one board tile by tile, used when tiles are too large to code in an int64. '''
         if delta not in self.tiles:
             raise ValueError('No tiles stored for delta='+str(delta))
         
@@ -71,3 +77,53 @@ class TileClassifier(Classifier):
         prediction[...] = DEAD
         prediction[weight_alive>weight_dead] = ALIVE
         return prediction
+
+    def _predict_delta(self,end_boards,delta):
+        '''Predict a stack of boards. The weights of each distinct end tile
+        are summed once and then added to all boards at each tile
+        position.
+
+        '''
+        if delta not in self.tiles:
+            raise ValueError('No tiles stored for delta='+str(delta))
+
+        size = self.tile_size
+        if size*size>62:
+            return np.array([self._predict_board(end_board,delta) for end_board in end_boards])
+
+        (num_boards,num_rows,num_cols) = end_boards.shape
+        num_tile_rows = num_rows-size+1
+        num_tile_cols = num_cols-size+1
+
+        # same int codes as board_to_int for every tile of every board
+        alive = np.ascontiguousarray(end_boards==ALIVE,dtype=np.int64)
+        (board_stride,row_stride,col_stride) = alive.strides
+        tiles = as_strided(alive,(num_boards,num_tile_rows,num_tile_cols,size,size),(board_stride,row_stride,col_stride,row_stride,col_stride))
+        powers = (2**np.arange(size*size,dtype=np.int64)).reshape(size,size)
+        end_ints = np.tensordot(tiles,powers,axes=([3,4],[0,1]))
+        (unique_ints,inverse) = np.unique(end_ints,return_inverse=True)
+        inverse = inverse.reshape(end_ints.shape)
+
+        # weights each distinct end tile adds to its cells
+        tile_alive = np.zeros([len(unique_ints),size,size])
+        tile_dead = np.zeros([len(unique_ints),size,size])
+        for (index,end_int) in enumerate(unique_ints):
+            end_int = int(end_int)
+            if end_int in self.tiles[delta]:
+                weight = 1./self.counts[delta][end_int]
+                for start_int in self.tiles[delta][end_int]:
+                    subboard = int_to_board(start_int,size,size)
+                    tile_alive[index] += subboard * weight
+                    tile_dead[index] += (1-subboard) * weight
+
+        weight_alive = np.zeros([num_boards,num_rows,num_cols])
+        weight_dead = np.zeros([num_boards,num_rows,num_cols])
+        for i in range(num_tile_rows):
+            for j in range(num_tile_cols):
+                weight_alive[:,i:(i+size),j:(j+size)] += tile_alive[inverse[:,i,j]]
+                weight_dead[:,i:(i+size),j:(j+size)] += tile_dead[inverse[:,i,j]]
+
+        prediction = np.empty([num_boards,num_rows,num_cols])
+        prediction[...] = DEAD
+        prediction[weight_alive>weight_dead] = ALIVE
+        return prediction
@@ -34,22 +34,34 @@ class ConwayBoard:
         return census
     
 
-    def advance(self):
+    def advance(self,steps=1,method='census'):
         '''
-        Advance board by 1 step using Conway's Game of Life rules.
+        Advance board by steps (default 1) using Conway's Game of Life rules.
         http://www.loria.fr/~rougier/teaching/numpy/scripts/game-of-life-numpy.py
+
+        method - 'census' counts neighbors with shifted adds (default),
+                 'lut3x3' looks up each 3x3 neighborhood in a 512 entry rule table,
+                 'lut4x4' looks up each 4x4 block in a 65536 entry table of 2x2 centers
+
+        Multiple steps stop simulating once the board becomes a still
+        life or an oscillator with period 2 or 3, see ConwayBoardBatch.
         '''
         # only need to change board if something is alive, provides
         # slight performance boost for smallish boards that tend to
         # die out
         if (self.board==ALIVE).any():
-            census = self.__count_live_neighbors()
-            # Create boolean matrix based on GoL rules
-            birth = (census == 3) & (self.board == DEAD)
-            survive = ((census == 2) | (census == 3)) & (self.board == ALIVE)
+            if method=='census' and steps==1:
+                census = self.__count_live_neighbors()
+                # Create boolean matrix based on GoL rules
+                birth = (census == 3) & (self.board == DEAD)
+                survive = ((census == 2) | (census == 3)) & (self.board == ALIVE)
 
-            self.board[...] = DEAD # clear board to zero Ie no reallocate memory
-            self.board[birth|survive] = ALIVE # Apply boolean mask to board
+                self.board[...] = DEAD # clear board to zero Ie no reallocate memory
+                self.board[birth|survive] = ALIVE # Apply boolean mask to board
+            else:
+                batch = ConwayBoardBatch(boards=self.board[np.newaxis],detect_cycles=steps>1)
+                batch.advance(steps,method=method)
+                self.board[...] = batch.boards[0]
 
 
     def pretty_string(self):
@@ -60,3 +72,266 @@ class ConwayBoard:
     def __str__(self):
         ''' Automatic string printing using str(conway_board). '''
         return self.pretty_string()
+
+_rule_tables = dict()
+
+def _rule_table(name):
+    '''Precomputed rule tables, built on first use.
+
+    'lut3x3' - 512 entries, index bit 3*i+j is cell (i,j) of a 3x3
+               neighborhood, value is the next state of the center cell
+    'lut4x4' - 65536 entries, index bit 4*i+j is cell (i,j) of a 4x4
+               block, value bit 2*i+j is the next state of center cell (i+1,j+1)
+    '''
+    if name not in _rule_tables:
+        if name=='lut3x3':
+            size = 3
+        elif name=='lut4x4':
+            size = 4
+        else:
+            raise ValueError('Unknown advance method='+str(name))
+        index = np.arange(2**(size*size))
+        cells = ((index[:,np.newaxis]>>np.arange(size*size))&1).reshape(len(index),size,size)
+        table = np.zeros(len(index),dtype=np.uint8)
+        for i in range(size-2):
+            for j in range(size-2):
+                census = cells[:,i:i+3,j:j+3].sum(axis=(1,2))-cells[:,i+1,j+1]
+                alive = (census==3) | ((census==2) & (cells[:,i+1,j+1]==1))
+                table |= alive.astype(np.uint8)<<((size-2)*i+j)
+        _rule_tables[name] = table
+    return _rule_tables[name]
+
+
+class ConwayBoardBatch:
+    '''Stack of equally sized Conway boards that are advanced together.
+
+    Boards are stored as one 3d array of shape (num_boards,num_rows,num_cols)
+    and the scratch arrays used by advance are allocated once, so
+    advancing many boards costs a handful of numpy calls per step
+    instead of a python-level advance call per board.
+
+    With detect_cycles=True the last 3 states of every board are kept
+    and boards that have become a still life or an oscillator with
+    period 2 or 3 are no longer simulated, their later states are read
+    off the cycle instead. Once every board has settled the remaining
+    steps are skipped entirely. The detected periods are kept between
+    calls to advance (0 means not settled yet).
+
+    usage:
+    >>> batch = ConwayBoardBatch(boards=[e.start_board.board for e in examples])
+    >>> batch.advance(steps=5)
+    >>> batch[0] # ConwayBoard for the first board
+    '''
+
+    max_period = 3
+
+    def __init__(self,num_boards=0,rows=0,cols=0,boards=None,detect_cycles=False):
+        ''' Construct num_boards all dead boards of size rows x cols or initialize from a stack of boards. '''
+        if boards is None:
+            self.boards = np.empty([num_boards,rows,cols],dtype=int)
+            self.boards[...] = DEAD
+        else:
+            # own copy so advance doesn't change the caller's boards
+            self.boards = np.array(boards,copy=True)
+            if self.boards.ndim!=3:
+                raise ValueError('boards must be a stack of 2d boards, got shape '+str(self.boards.shape))
+        (self.num_boards,self.num_rows,self.num_cols) = self.boards.shape
+
+        # scratch space reused by every step, the border of the padded
+        # array is never written so it stays DEAD
+        self._padded = np.zeros([self.num_boards,self.num_rows+2,self.num_cols+2],dtype=np.uint8)
+        self._census = np.empty(self.boards.shape,dtype=np.uint8)
+        self._birth = np.empty(self.boards.shape,dtype=bool)
+        self._survive = np.empty(self.boards.shape,dtype=bool)
+        # buffers only needed by the rule table methods
+        self._buffers = dict()
+
+        self.detect_cycles = detect_cycles
+        self.periods = np.zeros(self.num_boards,dtype=int)
+        if detect_cycles:
+            # ring buffer of the last max_period states (state at step t
+            # is in slot t%max_period) along with their populations,
+            # which are compared first to rule out most boards cheaply
+            self._time = 0
+            self._history = np.zeros([self.max_period]+list(self.boards.shape),dtype=np.uint8)
+            self._populations = np.zeros([self.max_period,self.num_boards],dtype=int)
+
+    def __len__(self):
+        return self.num_boards
+
+    def __getitem__(self,index):
+        ''' ConwayBoard copy of a single board. '''
+        return ConwayBoard(board=self.boards[index])
+
+    def _buffer(self,name,shape,dtype):
+        ''' Scratch array allocated on first use and reused after. '''
+        if name not in self._buffers:
+            self._buffers[name] = np.zeros(shape,dtype=dtype)
+        return self._buffers[name]
+
+    def _step(self,boards):
+        ''' Advance boards (the whole stack or a copy of its first rows) by 1 step in place. '''
+        m = len(boards)
+        Z = self._padded[:m]
+        Z[:,1:-1,1:-1] = boards
+        census = self._census[:m]
+        # summation of the 8 translations of each board
+        np.add(Z[:,0:-2,0:-2],Z[:,0:-2,1:-1],out=census)
+        np.add(census,Z[:,0:-2,2:  ],out=census)
+        np.add(census,Z[:,1:-1,0:-2],out=census)
+        np.add(census,Z[:,1:-1,2:  ],out=census)
+        np.add(census,Z[:,2:  ,0:-2],out=census)
+        np.add(census,Z[:,2:  ,1:-1],out=census)
+        np.add(census,Z[:,2:  ,2:  ],out=census)
+
+        # birth or survival with 3 neighbors, survival only with 2
+        birth = self._birth[:m]
+        survive = self._survive[:m]
+        np.equal(census,3,out=birth)
+        np.equal(census,2,out=survive)
+        np.logical_and(survive,Z[:,1:-1,1:-1],out=survive)
+        np.logical_or(birth,survive,out=birth)
+        boards[...] = birth
+
+    def _step_lut3x3(self,boards):
+        ''' Advance boards by 1 step by looking up each 3x3 neighborhood. '''
+        (m,r,c) = boards.shape
+        n = self.num_boards
+        Z = self._buffer('padded3x3',[n,r+2,c+2],np.uint16)[:m]
+        Z[:,1:-1,1:-1] = boards
+        # 3 bit code for each horizontal run of 3 cells, then stack 3 rows of codes
+        row_code = self._buffer('row_code3x3',[n,r+2,c],np.uint16)[:m]
+        shifted = self._buffer('shifted3x3',[n,r+2,c],np.uint16)[:m]
+        row_code[...] = Z[:,:,0:c]
+        for j in (1,2):
+            np.left_shift(Z[:,:,j:j+c],j,out=shifted)
+            np.bitwise_or(row_code,shifted,out=row_code)
+        index = self._buffer('index3x3',[n,r,c],np.uint16)[:m]
+        index[...] = row_code[:,0:r]
+        for i in (1,2):
+            np.left_shift(row_code[:,i:i+r],3*i,out=shifted[:,0:r])
+            np.bitwise_or(index,shifted[:,0:r],out=index)
+        boards[...] = np.take(_rule_table('lut3x3'),index,out=self._buffer('next3x3',[n,r,c],np.uint8)[:m])
+
+    def _step_lut4x4(self,boards):
+        '''Advance boards by 1 step by looking up each 2x2 block together
+        with the ring of cells around it.
+
+        '''
+        (m,r,c) = boards.shape
+        n = self.num_boards
+        # round up to even size, extra row/column is off board so DEAD
+        (half_r,half_c) = ((r+1)//2,(c+1)//2)
+        Z = self._buffer('padded4x4',[n,2*half_r+2,2*half_c+2],np.uint16)[:m]
+        Z[:,1:r+1,1:c+1] = boards
+        # 4 bit code for the 4 cells of each block column in a row, then stack 4 rows of codes
+        row_code = self._buffer('row_code4x4',[n,2*half_r+2,half_c],np.uint16)[:m]
+        shifted = self._buffer('shifted4x4',[n,2*half_r+2,half_c],np.uint16)[:m]
+        row_code[...] = Z[:,:,0:2*half_c:2]
+        for j in (1,2,3):
+            np.left_shift(Z[:,:,j:j+2*half_c:2],j,out=shifted)
+            np.bitwise_or(row_code,shifted,out=row_code)
+        index = self._buffer('index4x4',[n,half_r,half_c],np.uint16)[:m]
+        index[...] = row_code[:,0:2*half_r:2]
+        for i in (1,2,3):
+            np.left_shift(row_code[:,i:i+2*half_r:2],4*i,out=shifted[:,0:half_r])
+            np.bitwise_or(index,shifted[:,0:half_r],out=index)
+        blocks = np.take(_rule_table('lut4x4'),index,out=self._buffer('blocks4x4',[n,half_r,half_c],np.uint8)[:m])
+        # scatter the 4 bits of each block back to the board
+        for i in range(2):
+            for j in range(2):
+                boards[:,i::2,j::2] = ((blocks>>(2*i+j))&1)[:,0:(r-i+1)//2,0:(c-j+1)//2]
+
+    def _state_ago(self,steps_ago):
+        ''' Stored state of all boards steps_ago (1 to max_period) steps ago. '''
+        return self._history[(self._time-steps_ago)%self.max_period]
+
+    def _cycle_state(self,states,steps):
+        '''State of each settled board steps after now (steps may be
+        negative), given states=(now,1 step ago,2 steps ago).
+
+        '''
+        result = states[0].copy()
+        for period in range(2,self.max_period+1):
+            for phase in range(1,period):
+                # phase steps into the cycle is the same as period-phase steps ago
+                at_phase = (self.periods==period) & (steps%period==phase)
+                result[at_phase] = states[period-phase][at_phase]
+        return result
+
+    def _step_with_cycles(self,step):
+        ''' Advance by 1 step, only simulating boards that haven't settled, and look for new cycles. '''
+        slot = self._time%self.max_period
+        self._history[slot] = self.boards
+        if self._time==0:
+            self._populations[slot] = self.boards.sum(axis=(1,2))
+        self._time += 1
+
+        settled = self.periods>0
+        if 4*np.count_nonzero(settled)>self.num_boards:
+            # enough settled that gathering the rest to simulate them is cheaper
+            active = np.flatnonzero(~settled)
+            boards = self.boards[active]
+            step(boards)
+            self.boards[active] = boards
+            # settled boards move along their cycle
+            for period in range(2,self.max_period+1):
+                cycling = np.flatnonzero(self.periods==period)
+                self.boards[cycling] = self._state_ago(period)[cycling]
+        else:
+            # settled boards can just be simulated along with the rest
+            step(self.boards)
+
+        population = self.boards.sum(axis=(1,2))
+        # shortest period wins, only boards with matching populations need a full comparison
+        unsettled = self.periods==0
+        for period in range(min(self._time,self.max_period),0,-1):
+            candidates = np.flatnonzero(unsettled & (population==self._populations[(self._time-period)%self.max_period]))
+            repeated = (self.boards[candidates]==self._state_ago(period)[candidates]).all(axis=(1,2))
+            self.periods[candidates[repeated]] = period
+        self._populations[self._time%self.max_period] = population
+
+    def advance(self,steps=1,method='census'):
+        '''Advance all boards by steps using Conway's Game of Life rules.
+
+        method - 'census', 'lut3x3' or 'lut4x4', see ConwayBoard.advance
+        '''
+        if method=='census':
+            step = self._step
+        elif method=='lut3x3':
+            step = self._step_lut3x3
+        elif method=='lut4x4':
+            step = self._step_lut4x4
+        else:
+            raise ValueError('Unknown advance method='+str(method))
+
+        for i in range(steps):
+            # same shortcut as ConwayBoard.advance, nothing changes once
+            # every board has died out
+            if not (self.boards==ALIVE).any():
+                break
+            if not self.detect_cycles:
+                step(self.boards)
+            elif (self.periods>0).all():
+                self._skip(steps-i)
+                break
+            else:
+                self._step_with_cycles(step)
+
+    def _skip(self,steps):
+        ''' Jump every (settled) board ahead by steps without simulating. '''
+        states = (self.boards.copy(),self._state_ago(1).copy(),self._state_ago(2).copy())
+        self.boards[...] = self._cycle_state(states,steps)
+        self._time += steps
+        for k in range(1,self.max_period+1):
+            slot = (self._time-k)%self.max_period
+            self._history[slot] = self._cycle_state(states,steps-k)
+            self._populations[slot] = self._history[slot].sum(axis=(1,2))
+        self._populations[self._time%self.max_period] = self.boards.sum(axis=(1,2))
+
+
+def advance_many(boards,steps=1,method='census',detect_cycles=False):
+    ''' Return a copy of a stack of boards (num_boards x num_rows x num_cols) advanced by steps. '''
+    batch = ConwayBoardBatch(boards=boards,detect_cycles=detect_cycles)
+    batch.advance(steps,method=method)
+    return batch.boards
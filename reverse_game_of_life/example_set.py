@@ -0,0 +1,179 @@
+import numpy as np
+
+from .conway_board import advance_many
+from .kaggle_example import KaggleExample,create_example_arrays,load_example_arrays
+
+
+class ExampleSet:
+    '''Set of reverse conway examples stored as arrays instead of a list of
+    KaggleExample objects: ids, deltas, start boards and end boards,
+    boards as uint8 stacks of shape (num_examples,num_rows,num_cols).
+
+    Slicing, indexing with arrays, for_delta and shuffle return views
+    that share the underlying arrays, boards are only gathered when
+    the start_boards/end_boards attributes are read. Iterating or
+    indexing with an int gives KaggleExample objects so an ExampleSet
+    can be used anywhere a list of examples is expected.
+
+    usage:
+    >>> examples = ExampleSet.create(num_examples=1000,seed=0)
+    >>> examples.for_delta(1) # view of the delta=1 examples
+    >>> train,test = examples[0:500],examples[500:1000]
+    >>> examples.end_boards # num_examples x 20 x 20 uint8 array
+    '''
+
+    def __init__(self,deltas,start_boards=None,end_boards=None,ids=None):
+        ''' Construct from arrays, the end boards are computed if only start boards are supplied. '''
+        if start_boards is None and end_boards is None:
+            raise ValueError('start_boards and end_boards cannot both be None')
+        self._deltas = np.asarray(deltas,dtype=int)
+        self._start_boards = None if start_boards is None else np.asarray(start_boards,dtype=np.uint8)
+        if end_boards is None:
+            end_boards = np.empty(self._start_boards.shape,dtype=np.uint8)
+            for delta in np.unique(self._deltas):
+                at_delta = self._deltas==delta
+                end_boards[at_delta] = advance_many(self._start_boards[at_delta],steps=delta,detect_cycles=True)
+        self._end_boards = np.asarray(end_boards,dtype=np.uint8)
+        self._ids = None if ids is None else np.asarray(ids)
+        # positions of the examples in the arrays, None for all of them in order
+        self._index = None
+        self._delta_views = dict()
+
+    @classmethod
+    def from_examples(cls,examples):
+        ''' ExampleSet with copies of the boards in a list of KaggleExample. '''
+        examples = list(examples)
+        if len(examples)==0:
+            raise ValueError('examples must be non-empty')
+        start_missing = [e.start_board is None for e in examples]
+        if any(start_missing) and not all(start_missing):
+            raise ValueError('all or none of the examples must have a start_board')
+        start_boards = None if all(start_missing) else [e.start_board.board for e in examples]
+        kaggle_ids = [e.kaggle_id for e in examples]
+        ids = None if None in kaggle_ids else kaggle_ids
+        return cls([e.delta for e in examples],start_boards,[e.end_board.board for e in examples],ids)
+
+    @classmethod
+    def create(cls,num_examples=1,**kwargs):
+        ''' Create random examples, takes the same arguments as create_example_arrays. '''
+        (deltas,start_boards,end_boards) = create_example_arrays(num_examples,**kwargs)
+        return cls(deltas,start_boards,end_boards)
+
+    @classmethod
+    def load(cls,file_name,num_rows=20,num_cols=20,use_cache=True):
+        ''' Load examples from a Kaggle .csv file, see load_example_arrays. '''
+        (ids,deltas,start_boards,end_boards) = load_example_arrays(file_name,num_rows,num_cols,use_cache=use_cache)
+        return cls(deltas,start_boards,end_boards,ids)
+
+    def __getstate__(self):
+        ''' Pickle only the examples in this set, not all of the arrays a view shares. '''
+        state = dict(self.__dict__)
+        for name in ('_deltas','_start_boards','_end_boards','_ids'):
+            state[name] = self._take(state[name])
+        state['_index'] = None
+        state['_delta_views'] = dict()
+        return state
+
+    def _take(self,a):
+        ''' Rows of a for the examples in this set. '''
+        if a is None or self._index is None:
+            return a
+        return a[self._index]
+
+    @property
+    def deltas(self):
+        return self._take(self._deltas)
+
+    @property
+    def start_boards(self):
+        return self._take(self._start_boards)
+
+    @property
+    def end_boards(self):
+        return self._take(self._end_boards)
+
+    @property
+    def ids(self):
+        return self._take(self._ids)
+
+    @property
+    def board_shape(self):
+        ''' (num_rows,num_cols) of the boards. '''
+        return self._end_boards.shape[1:]
+
+    def __len__(self):
+        if self._index is None:
+            return len(self._deltas)
+        return len(self._index)
+
+    def _view(self,index):
+        ''' ExampleSet sharing this set's arrays with the examples at positions index of this set. '''
+        view = ExampleSet.__new__(ExampleSet)
+        view.__dict__.update(self.__dict__)
+        view._delta_views = dict()
+        if self._index is not None:
+            view._index = self._index[index]
+        elif isinstance(index,slice):
+            # plain slices of the arrays are numpy views
+            view._index = None
+            view._deltas = self._deltas[index]
+            view._start_boards = None if self._start_boards is None else self._start_boards[index]
+            view._end_boards = self._end_boards[index]
+            view._ids = None if self._ids is None else self._ids[index]
+        else:
+            view._index = np.arange(len(self))[index]
+        return view
+
+    def __getitem__(self,index):
+        ''' KaggleExample for an int, ExampleSet view for a slice, index array or boolean mask. '''
+        if isinstance(index,(int,np.integer)):
+            if index<0:
+                index += len(self)
+            i = index if self._index is None else self._index[index]
+            start_board = None if self._start_boards is None else self._start_boards[i].astype(int)
+            kaggle_id = None if self._ids is None else int(self._ids[i])
+            return KaggleExample(delta=int(self._deltas[i]),start_board=start_board,end_board=self._end_boards[i].astype(int),kaggle_id=kaggle_id)
+        return self._view(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def unique_deltas(self):
+        ''' Sorted list of the deltas in this set. '''
+        return [int(delta) for delta in np.unique(self.deltas)]
+
+    def for_delta(self,delta):
+        ''' View of the examples with this delta, cached after the first call. '''
+        if delta not in self._delta_views:
+            self._delta_views[delta] = self._view(np.flatnonzero(self.deltas==delta))
+        return self._delta_views[delta]
+
+    def shuffle(self,seed=None):
+        ''' View of the examples in random order. '''
+        return self._view(np.random.default_rng(seed).permutation(len(self)))
+
+
+def as_example_set(examples):
+    ''' ExampleSet for examples, which may already be one or a list of KaggleExample. '''
+    if isinstance(examples,ExampleSet):
+        return examples
+    return ExampleSet.from_examples(examples)
+
+def iter_chunks(examples,chunk_size=1000):
+    '''Split examples (ExampleSet, list or iterable of KaggleExample such
+    as iter_examples) into ExampleSets of at most chunk_size examples.
+
+    '''
+    if isinstance(examples,ExampleSet):
+        for start in range(0,len(examples),chunk_size):
+            yield examples[start:start+chunk_size]
+        return
+    chunk = []
+    for example in examples:
+        chunk.append(example)
+        if len(chunk)==chunk_size:
+            yield ExampleSet.from_examples(chunk)
+            chunk = []
+    if len(chunk)>0:
+        yield ExampleSet.from_examples(chunk)
@@ -0,0 +1,237 @@
+import numpy as np
+
+from .conway_board import DEAD,ALIVE,_rule_table
+
+# cells outside the board, never become alive and never count as a
+# neighbor, which gives the same results as the DEAD padding used by
+# ConwayBoard.advance
+WALL = -1
+
+
+class _Node:
+    ''' Quadtree node, 2**level cells on a side. Nodes are interned by HashLife so equal sub-blocks are the same object. '''
+    __slots__ = ('level','nw','ne','sw','se','population','value','alive_bits','wall_bits','result')
+
+    def __init__(self,level,nw=None,ne=None,sw=None,se=None,value=None):
+        self.level = level
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.value = value
+        # cached successor for the full 2**(level-2) steps
+        self.result = None
+        if level==0:
+            self.population = 1 if value==ALIVE else 0
+            self.alive_bits = 1 if value==ALIVE else 0
+            self.wall_bits = 1 if value==WALL else 0
+        else:
+            self.population = nw.population+ne.population+sw.population+se.population
+            if level<=2:
+                # cell (i,j) of the block in bit i*size+j, used for the 4x4 rule table
+                size = 2**level
+                half = size//2
+                self.alive_bits = 0
+                self.wall_bits = 0
+                for (quad,shift) in ((nw,0),(ne,half),(sw,half*size),(se,half*size+half)):
+                    for i in range(half):
+                        row_mask = (2**half-1)<<(i*half)
+                        self.alive_bits |= ((quad.alive_bits&row_mask)>>(i*half))<<(shift+i*size)
+                        self.wall_bits |= ((quad.wall_bits&row_mask)>>(i*half))<<(shift+i*size)
+
+
+class HashLife:
+    '''Memoized quadtree engine (Hashlife) that jumps boards forward many
+    steps at once.
+
+    Identical sub-blocks are stored once and the result of advancing a
+    block is cached, so repeated still lifes, oscillators and dead
+    regions are only ever simulated once, across steps and across
+    boards advanced by the same HashLife object. Results match
+    ConwayBoard.advance, ie cells off the board are always DEAD.
+
+    usage:
+    >>> hl = HashLife()
+    >>> end_board = hl.advance(board,steps=1000)
+    >>> end_boards = hl.advance_many(boards,steps=5)
+    >>> hl.clear() # drop cached nodes
+    '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        ''' Remove all interned nodes and cached results. '''
+        self._nodes = dict()
+        self._successors = dict()
+        self._leaves = dict([(v,_Node(0,value=v)) for v in (DEAD,ALIVE,WALL)])
+        self._walls = [self._leaves[WALL]]
+
+    def _join(self,nw,ne,sw,se):
+        ''' Interned node with these 4 quadrants. '''
+        key = (nw,ne,sw,se)
+        node = self._nodes.get(key)
+        if node is None:
+            node = _Node(nw.level+1,nw,ne,sw,se)
+            self._nodes[key] = node
+        return node
+
+    def _wall(self,level):
+        ''' All WALL node of level. '''
+        while len(self._walls)<=level:
+            w = self._walls[-1]
+            self._walls.append(self._join(w,w,w,w))
+        return self._walls[level]
+
+    def _center(self,node):
+        ''' Center quarter of node, one level down. '''
+        return self._join(node.nw.se,node.ne.sw,node.sw.ne,node.se.nw)
+
+    def _base(self,node):
+        ''' Center 2x2 of a 4x4 node after 1 step. '''
+        # WALL cells are never alive so the plain rule table gives the
+        # right neighbor counts, they just have to stay WALL
+        alive = int(_rule_table('lut4x4')[node.alive_bits])
+        walls = node.wall_bits
+        leaves = []
+        for (bit,cell) in ((0,5),(1,6),(2,9),(3,10)):
+            if (walls>>cell)&1:
+                leaves.append(self._leaves[WALL])
+            elif (alive>>bit)&1:
+                leaves.append(self._leaves[ALIVE])
+            else:
+                leaves.append(self._leaves[DEAD])
+        return self._join(*leaves)
+
+    def _successor(self,node,j):
+        '''Center of node (one level down) after 2**j steps, j is capped
+        at node.level-2.
+
+        '''
+        if j>=node.level-2:
+            j = node.level-2
+            if node.result is not None:
+                return node.result
+            key = None
+        else:
+            key = (node,j)
+            result = self._successors.get(key)
+            if result is not None:
+                return result
+
+        if node.population==0:
+            # only DEAD and WALL cells, nothing ever changes
+            result = self._center(node)
+        elif node.level==2:
+            result = self._base(node)
+        else:
+            join = self._join
+            (nw,ne,sw,se) = (node.nw,node.ne,node.sw,node.se)
+            # 9 overlapping sub-blocks one level down, advanced 2**j steps
+            # (but no more than half the steps this level allows)
+            c1 = self._successor(nw,j)
+            c2 = self._successor(join(nw.ne,ne.nw,nw.se,ne.sw),j)
+            c3 = self._successor(ne,j)
+            c4 = self._successor(join(nw.sw,nw.se,sw.nw,sw.ne),j)
+            c5 = self._successor(join(nw.se,ne.sw,sw.ne,se.nw),j)
+            c6 = self._successor(join(ne.sw,ne.se,se.nw,se.ne),j)
+            c7 = self._successor(sw,j)
+            c8 = self._successor(join(sw.ne,se.nw,sw.se,se.sw),j)
+            c9 = self._successor(se,j)
+            if j<node.level-2:
+                # already advanced 2**j steps, just assemble the center
+                result = join(join(c1.se,c2.sw,c4.ne,c5.nw),
+                              join(c2.se,c3.sw,c5.ne,c6.nw),
+                              join(c4.se,c5.sw,c7.ne,c8.nw),
+                              join(c5.se,c6.sw,c8.ne,c9.nw))
+            else:
+                # advanced half the steps, second half on the 4 overlapping quarters
+                result = join(self._successor(join(c1,c2,c4,c5),j),
+                              self._successor(join(c2,c3,c5,c6),j),
+                              self._successor(join(c4,c5,c7,c8),j),
+                              self._successor(join(c5,c6,c8,c9),j))
+
+        if key is None:
+            node.result = result
+        else:
+            self._successors[key] = result
+        return result
+
+    def _from_board(self,board):
+        '''Node of level m containing board in its top left corner, rest is
+        WALL, with 2**m >= size of board.
+
+        '''
+        (num_rows,num_cols) = board.shape
+        level = max(1,int(np.ceil(np.log2(max(num_rows,num_cols,1)))))
+        size = 2**level
+        grid = np.empty([size,size],dtype=int)
+        grid[...] = 2
+        grid[0:num_rows,0:num_cols] = np.where(board==ALIVE,1,0)
+
+        # build bottom up, only creating nodes for unique blocks
+        nodes = [self._leaves[DEAD],self._leaves[ALIVE],self._leaves[WALL]]
+        ids = grid
+        for l in range(level):
+            quads = np.stack([ids[0::2,0::2],ids[0::2,1::2],ids[1::2,0::2],ids[1::2,1::2]],axis=-1)
+            (unique_quads,inverse) = np.unique(quads.reshape(-1,4),axis=0,return_inverse=True)
+            nodes = [self._join(nodes[a],nodes[b],nodes[c],nodes[d]) for (a,b,c,d) in unique_quads]
+            ids = inverse.reshape(quads.shape[0:2])
+        return nodes[ids[0,0]],level
+
+    def _fill(self,node,top,left,out):
+        ''' Write the part of node at (top,left) that overlaps out into out. '''
+        (num_rows,num_cols) = out.shape
+        size = 2**node.level
+        if top>=num_rows or left>=num_cols or top+size<=0 or left+size<=0 or node.population==0:
+            # out is all DEAD already
+            return
+        if node.level==0:
+            out[top,left] = ALIVE
+        else:
+            half = size//2
+            self._fill(node.nw,top,left,out)
+            self._fill(node.ne,top,left+half,out)
+            self._fill(node.sw,top+half,left,out)
+            self._fill(node.se,top+half,left+half,out)
+
+    def advance(self,board,steps=1):
+        ''' Return copy of board (2d array of ALIVE and DEAD) advanced by steps. '''
+        board = np.asarray(board)
+        (node,level) = self._from_board(board)
+        # embed so board sits in the center half of the root, which is
+        # the part successor computes
+        w = self._wall(level)
+        node = self._join(self._join(w,w,w,node),self._wall(level+1),self._wall(level+1),self._wall(level+1))
+        offset = 2**level
+
+        # largest power of 2 steps first
+        j = 0
+        while 2**(j+1)<=steps:
+            j += 1
+        while steps>0:
+            if 2**j<=steps:
+                while node.level-2<j:
+                    # grow with WALL around, board moves to the center
+                    w = self._wall(node.level-1)
+                    offset += 2**(node.level-1)
+                    node = self._join(self._join(w,w,w,node.nw),self._join(w,w,node.ne,w),
+                                      self._join(w,node.sw,w,w),self._join(node.se,w,w,w))
+                result = self._successor(node,j)
+                offset -= 2**(node.level-2)
+                # put back in the center of a node of the original level
+                w = self._wall(result.level-1)
+                offset += 2**(result.level-1)
+                node = self._join(self._join(w,w,w,result.nw),self._join(w,w,result.ne,w),
+                                  self._join(w,result.sw,w,w),self._join(result.se,w,w,w))
+                steps -= 2**j
+            j -= 1
+
+        out = np.empty(board.shape,dtype=int)
+        out[...] = DEAD
+        self._fill(node,-offset,-offset,out)
+        return out
+
+    def advance_many(self,boards,steps=1):
+        ''' Return copy of stack of boards advanced by steps, cached results are shared between the boards. '''
+        return np.array([self.advance(board,steps) for board in boards])
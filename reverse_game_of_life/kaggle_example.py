@@ -1,10 +1,14 @@
 
 import csv
+import os
+import tempfile
+import zipfile
 
 import numpy as np
-from random import random,choice
+from random import random
 
-from .conway_board import ConwayBoard,ALIVE,DEAD
+from .conway_board import ConwayBoard,ConwayBoardBatch,ALIVE,DEAD
+from .tools import effective_n_jobs,parallel_map
 
 class KaggleExample:
     '''A reverse conway example for kaggle compeition, stores the
@@ -23,8 +27,7 @@ class KaggleExample:
             self.start_board = ConwayBoard(board=start_board)
             # compute the ending board
             self.end_board = ConwayBoard(board=start_board)
-            for i in range(self.delta):
-                self.end_board.advance()
+            self.end_board.advance(steps=self.delta)
         elif start_board is None:
             self.start_board = None
             self.end_board = ConwayBoard(board=end_board)
@@ -36,15 +39,27 @@ class KaggleExample:
         ''' Computer error rate of predicted start board. '''
         if self.start_board is None:
             raise RuntimeError('Cannot evaluate an example with no start board.')
-        # the magic of broadcasting ... maybe
-        errors = sum([int(label)!=int(predict) for label,predict in np.nditer([self.start_board.board,predicted_board])])
-        return 1.0*errors/(self.start_board.num_rows*self.start_board.num_cols)
+        return float(error_rates(np.asarray(predicted_board)[np.newaxis],self.start_board.board[np.newaxis])[0])
 
     def __str__(self):
         ''' A human readable string representation. '''
         return 'delta='+str(self.delta)+'\nstart board:\n'+str(self.start_board)+'\nend_board:\n'+str(self.end_board)
 
 
+def error_rates(predicted_boards,start_boards):
+    '''Error rate of each predicted start board, predicted_boards and
+    start_boards are stacks of boards (num_examples x num_rows x
+    num_cols). Returns array of num_examples error rates.
+
+    '''
+    predicted_boards = np.asarray(predicted_boards)
+    start_boards = np.asarray(start_boards)
+    if predicted_boards.shape!=start_boards.shape:
+        # broadcast single boards like evaluate always has
+        predicted_boards = np.broadcast_to(predicted_boards,start_boards.shape)
+    return (predicted_boards!=start_boards).mean(axis=(1,2))
+
+
 # example creation routines
 def create_random_board(num_rows,num_cols,fill_percent):
     ''' Create a randomly initialzed ConwayBoard. '''
@@ -54,74 +69,232 @@ def create_example(num_rows, num_cols, delta, fill_percent,burn_in):
     ''' Create an example for reverse game of life. '''
     board = create_random_board(num_rows,num_cols,fill_percent)
     # do burn in
-    for i in range(burn_in):
-        board.advance()
+    board.advance(steps=burn_in)
     return KaggleExample(delta=delta, start_board=board.board)
 
-def create_examples(num_examples=1, deltas=list(range(1,6)),num_rows=20,num_cols=20,burn_in=5,min_fill=0.01,max_fill=0.99):
-    ''' Create examples for reverse game of life task. '''
-    example_list = list()
-    
-    while len(example_list) < num_examples:
-        e = create_example(num_rows,num_cols,choice(deltas), random()*(max_fill-min_fill)+min_fill,burn_in)
+def create_random_boards(num_boards,num_rows,num_cols,fill_percents,rng):
+    ''' Create a stack of random uint8 boards, board i has cells ALIVE with probability fill_percents[i]. '''
+    cells = rng.random((num_boards,num_rows,num_cols))<np.reshape(fill_percents,(num_boards,1,1))
+    boards = np.empty(cells.shape,dtype=np.uint8)
+    boards[...] = DEAD
+    boards[cells] = ALIVE
+    return boards
+
+def _create_example_arrays_worker(args):
+    ''' Create part of the examples in a worker process. '''
+    (num_examples,seed,kwargs) = args
+    return create_example_arrays(num_examples,seed=seed,**kwargs)
+
+def create_example_arrays(num_examples=1, deltas=list(range(1,6)),num_rows=20,num_cols=20,burn_in=5,min_fill=0.01,max_fill=0.99,seed=None,batch_size=10000,n_jobs=1):
+    '''Create examples for reverse game of life task as arrays, returns
+    (deltas,start_boards,end_boards) with boards as uint8 stacks.
+
+    seed - int or numpy.random.Generator, the same seed always gives the same examples
+    batch_size - max number of boards simulated at once
+    n_jobs - number of processes to split generation across (-1 for all
+             cpus), each gets its own seed spawned from seed so results
+             are reproducible for the same seed and n_jobs
+    '''
+    n_jobs = min(effective_n_jobs(n_jobs),max(1,num_examples))
+    if n_jobs>1:
+        if isinstance(seed,np.random.Generator):
+            seed = seed.integers(2**63)
+        seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+        kwargs = dict(deltas=deltas,num_rows=num_rows,num_cols=num_cols,burn_in=burn_in,min_fill=min_fill,max_fill=max_fill,batch_size=batch_size)
+        jobs = [(num_examples//n_jobs+(1 if i<num_examples%n_jobs else 0),seeds[i],kwargs) for i in range(n_jobs)]
+        parts = parallel_map(_create_example_arrays_worker,jobs,n_jobs=n_jobs)
+        return tuple([np.concatenate([part[i] for part in parts]) for i in range(3)])
+
+    rng = np.random.default_rng(seed)
+    deltas = np.asarray(deltas)
+    example_deltas = list()
+    start_boards = list()
+    end_boards = list()
+    num_created = 0
+
+    while num_created < num_examples:
+        # simulate missing examples together as one batch
+        num_boards = min(num_examples-num_created,batch_size)
+        batch_deltas = rng.choice(deltas,size=num_boards)
+        fill_percents = rng.random(num_boards)*(max_fill-min_fill)+min_fill
+        # boards that settle into a still life or short oscillator stop being simulated
+        batch = ConwayBoardBatch(boards=create_random_boards(num_boards,num_rows,num_cols,fill_percents,rng),detect_cycles=True)
+        # do burn in
+        batch.advance(burn_in)
+        batch_start = batch.boards.copy()
+        # advance to the largest delta, grabbing each end board as its delta is reached
+        batch_end = batch_start.copy()
+        for step in range(1,batch_deltas.max()+1):
+            batch.advance()
+            at_delta = batch_deltas==step
+            batch_end[at_delta] = batch.boards[at_delta]
+
         # keep only if end_board is non-empty
-        if (e.end_board.board==ALIVE).any():
-            example_list.append(e)
-            
-    return example_list
+        keep = (batch_end==ALIVE).any(axis=(1,2))
+        example_deltas.append(batch_deltas[keep])
+        start_boards.append(batch_start[keep])
+        end_boards.append(batch_end[keep])
+        num_created += np.count_nonzero(keep)
+
+    return (np.concatenate(example_deltas),np.concatenate(start_boards),np.concatenate(end_boards))
+
+def examples_from_arrays(deltas,start_boards,end_boards):
+    ''' List of KaggleExample from arrays as returned by create_example_arrays. '''
+    return [KaggleExample(delta=int(delta),start_board=start_board.astype(int),end_board=end_board.astype(int))
+            for (delta,start_board,end_board) in zip(deltas,start_boards,end_boards)]
+
+def create_examples(num_examples=1, deltas=list(range(1,6)),num_rows=20,num_cols=20,burn_in=5,min_fill=0.01,max_fill=0.99,seed=None,n_jobs=1):
+    ''' Create examples for reverse game of life task. Pass seed (int or numpy.random.Generator) for reproducible examples and n_jobs to generate in parallel, see create_example_arrays. '''
+    return examples_from_arrays(*create_example_arrays(num_examples,deltas,num_rows,num_cols,burn_in,min_fill,max_fill,seed=seed,n_jobs=n_jobs))
+
+def iter_example_arrays(chunk_size=1000,num_examples=None,deltas=list(range(1,6)),num_rows=20,num_cols=20,burn_in=5,min_fill=0.01,max_fill=0.99,seed=None,worker_index=0,num_workers=1):
+    '''Generate examples on demand, yields (deltas,start_boards,end_boards)
+    chunks of at most chunk_size examples so only one chunk is in
+    memory at a time.
+
+    num_examples - total number of examples to yield (split between
+                   workers), None for an endless stream
+    deltas - only generate examples with these deltas
+    worker_index, num_workers - shard the stream, every worker gets an
+                   independent reproducible seed spawned from seed
+    '''
+    if isinstance(seed,np.random.Generator):
+        seed = seed.integers(2**63)
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(num_workers)[worker_index])
+    if num_examples is not None:
+        # this worker's share
+        num_examples = num_examples//num_workers+(1 if worker_index<num_examples%num_workers else 0)
+
+    num_yielded = 0
+    while num_examples is None or num_yielded<num_examples:
+        num_chunk = chunk_size if num_examples is None else min(chunk_size,num_examples-num_yielded)
+        yield create_example_arrays(num_chunk,deltas,num_rows,num_cols,burn_in,min_fill,max_fill,seed=rng,batch_size=chunk_size)
+        num_yielded += num_chunk
+
+def iter_examples(num_examples=None,chunk_size=1000,**kwargs):
+    ''' Generate KaggleExamples one at a time, see iter_example_arrays for arguments. '''
+    for arrays in iter_example_arrays(chunk_size=chunk_size,num_examples=num_examples,**kwargs):
+        for example in examples_from_arrays(*arrays):
+            yield example
         
 
 # example loading routines
-def load_examples(file_name,num_rows=20,num_cols=20):
-    ''' Load examples from .csv files as formatted by Kaggle. '''
+def _cache_file_name(file_name):
+    ''' Binary cache written next to a Kaggle .csv file. '''
+    return file_name+'.npz'
+
+def _load_cache(file_name,num_rows,num_cols):
+    ''' Arrays from the binary cache of file_name, None if there is no up to date and readable cache. '''
+    cache_name = _cache_file_name(file_name)
+    if not os.path.exists(cache_name) or os.path.getmtime(cache_name)<os.path.getmtime(file_name):
+        return None
+    try:
+        with np.load(cache_name) as cache:
+            if (int(cache['num_rows']),int(cache['num_cols']))!=(num_rows,num_cols):
+                return None
+            boards = list()
+            for name in ('start_boards','end_boards'):
+                if name in cache:
+                    bits = np.unpackbits(cache[name],axis=1)[:,0:num_rows*num_cols]
+                    boards.append(bits.reshape(len(bits),num_rows,num_cols))
+                else:
+                    boards.append(None)
+            return (cache['ids'],cache['deltas'],boards[0],boards[1])
+    except (zipfile.BadZipFile,ValueError,KeyError,EOFError,OSError):
+        # truncated or otherwise broken cache, parse the .csv again
+        return None
+
+def _save_cache(file_name,num_rows,num_cols,ids,deltas,start_boards,end_boards):
+    ''' Write arrays to the binary cache of file_name, boards are bit packed. '''
+    arrays = dict(ids=ids,deltas=deltas,num_rows=num_rows,num_cols=num_cols)
+    for (name,boards) in (('start_boards',start_boards),('end_boards',end_boards)):
+        if boards is not None:
+            arrays[name] = np.packbits(boards.reshape(len(boards),num_rows*num_cols),axis=1)
+    cache_name = _cache_file_name(file_name)
+    temp_name = None
+    try:
+        # write a temporary file and move it into place so readers never see a partial cache
+        (fd,temp_name) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_name)),suffix='.tmp')
+        with os.fdopen(fd,'wb') as cache_file:
+            np.savez(cache_file,**arrays)
+        os.replace(temp_name,cache_name)
+    except (IOError,OSError):
+        # caching is only an optimization, eg directory may be read only
+        if temp_name is not None and os.path.exists(temp_name):
+            os.remove(temp_name)
+
+def load_example_arrays(file_name,num_rows=20,num_cols=20,use_cache=True):
+    '''Load examples from .csv files as formatted by Kaggle into arrays,
+    returns (ids,deltas,start_boards,end_boards) with boards as uint8
+    stacks, start_boards or end_boards is None if not in the file.
+
+    use_cache - read from (and write) a bit packed file_name+'.npz'
+                cache, which is used while it is newer than the .csv
+    '''
+    if use_cache:
+        arrays = _load_cache(file_name,num_rows,num_cols)
+        if arrays is not None:
+            return arrays
+
     with open(file_name) as csvfile:
-        reader = csv.reader(csvfile)
-        header = next(reader)
+        header = next(csv.reader(csvfile))
         if not (len(header)==2+num_rows*num_cols or len(header)==2+2*num_rows*num_cols):
             raise RuntimeError('Unexpected number of columns ('+str(len(header))+ ') in example file.')
-        
-        examples = list()
-        for ex_data in reader:
-            ex_id = int(ex_data[0])
-            delta = int(ex_data[1])
-            start_board = None
-            end_board = None
-            index = 2
-            while index<len(ex_data):
-                # read board
-                a = np.array(ex_data[index:(index+num_rows*num_cols)],dtype='int')
-                # reshape
-                board = a.reshape((num_rows,num_cols))
-                # store in appropriate variable
-                if header[index]=='start.1':
-                    start_board = board
-                elif header[index]=='stop.1':
-                    end_board = board
-                else:
-                    raise RuntimeError('Unknown column header = '+header[index])
+        # parse all remaining rows at once
+        data = np.loadtxt(csvfile,delimiter=',',dtype=np.int64,ndmin=2)
+    # a file with only the header gives no rows of the right width
+    data = data.reshape(-1,len(header))
+
+    ids = data[:,0]
+    deltas = data[:,1]
+    start_boards = None
+    end_boards = None
+    for index in range(2,len(header),num_rows*num_cols):
+        boards = data[:,index:(index+num_rows*num_cols)].astype(np.uint8).reshape(len(data),num_rows,num_cols)
+        # store in appropriate variable
+        if header[index]=='start.1':
+            start_boards = boards
+        elif header[index]=='stop.1':
+            end_boards = boards
+        else:
+            raise RuntimeError('Unknown column header = '+header[index])
 
-                index += num_rows*num_cols
-                
-            examples.append(KaggleExample(kaggle_id=ex_id, delta=delta, start_board=start_board, end_board=end_board))
+    if use_cache:
+        _save_cache(file_name,num_rows,num_cols,ids,deltas,start_boards,end_boards)
+    return (ids,deltas,start_boards,end_boards)
 
-        
-        return examples
+def load_examples(file_name,num_rows=20,num_cols=20,use_cache=True):
+    ''' Load examples from .csv files as formatted by Kaggle, see load_example_arrays. '''
+    (ids,deltas,start_boards,end_boards) = load_example_arrays(file_name,num_rows,num_cols,use_cache=use_cache)
+    examples = list()
+    for i in range(len(ids)):
+        start_board = None if start_boards is None else start_boards[i].astype(int)
+        end_board = None if end_boards is None else end_boards[i].astype(int)
+        examples.append(KaggleExample(kaggle_id=int(ids[i]), delta=int(deltas[i]), start_board=start_board, end_board=end_board))
+    return examples
 
 # kaggle format example writing, ie predictions
 # get predictions and save from a classifer by
-# >>> predictions = [classifier.predict(e.end_board,e.delta) for e in examples]
+# >>> predictions = classifier.predict_examples(examples)
 # >>> save_examples('file.csv',examples,predictions)
 def save_examples(file_name,examples,predictions):
-    ''' Save predictions in kaggle format. '''
+    ''' Save predictions in kaggle format, examples is a list of KaggleExample or an ExampleSet. '''
+    if hasattr(examples,'end_boards'):
+        # ExampleSet
+        (num_rows,num_cols) = examples.board_shape
+        # like KaggleExamples without a kaggle_id, eg from ExampleSet.create
+        kaggle_ids = [None]*len(examples) if examples.ids is None else examples.ids
+    else:
+        (num_rows,num_cols) = examples[0].end_board.board.shape
+        kaggle_ids = [example.kaggle_id for example in examples]
     with open(file_name,'w') as csvfile:
         writer = csv.writer(csvfile)
         
-        (num_rows,num_cols) = examples[0].end_board.board.shape
         # header row
         header = ['id'] + ['start.'+str(i+1) for i in range(num_rows*num_cols)]
         writer.writerow(header)
-        for (example,prediction) in zip(examples,predictions):
-            row = [str(example.kaggle_id)] + [str(int(v)) for v in prediction.flatten()]
+        for (kaggle_id,prediction) in zip(kaggle_ids,predictions):
+            row = [str(kaggle_id)] + [str(int(v)) for v in np.asarray(prediction).flatten()]
             writer.writerow(row)
 
         
@@ -0,0 +1,130 @@
+import numpy as np
+
+from .conway_board import ConwayBoard,DEAD,ALIVE
+
+WORD_BITS = 64
+
+_ONE = np.uint64(1)
+_TOP = np.uint64(WORD_BITS-1)
+
+
+def pack_boards(boards):
+    '''Pack a stack of boards (num_boards x num_rows x num_cols) into
+    uint64 words, 1 bit per cell. Returns array of shape (num_boards,
+    num_rows, num_words), bit j of word k in a row is column
+    k*64+j. Can be reversed with unpack_boards.
+
+    '''
+    boards = np.asarray(boards)
+    (num_boards,num_rows,num_cols) = boards.shape
+    num_words = (num_cols+WORD_BITS-1)//WORD_BITS
+    bits = np.zeros([num_boards,num_rows,num_words*WORD_BITS],dtype=np.uint8)
+    bits[:,:,:num_cols] = boards==ALIVE
+    # little bit order so column j lands in bit j, then 8 bytes to a word
+    packed = np.packbits(bits,axis=2,bitorder='little')
+    return packed.view('<u8').astype(np.uint64)
+
+def unpack_boards(words,num_cols):
+    '''Unpack uint64 words created by pack_boards back to a stack of
+    ALIVE and DEAD boards with num_cols columns.
+
+    '''
+    words = np.asarray(words)
+    packed = np.ascontiguousarray(words.astype('<u8')).view(np.uint8)
+    bits = np.unpackbits(packed,axis=2,bitorder='little')[:,:,:num_cols]
+    boards = np.empty(bits.shape,dtype=int)
+    boards[...] = DEAD
+    boards[bits==1] = ALIVE
+    return boards
+
+
+def _full_adder(a,b,c):
+    ''' Bitwise sum and carry of three words. '''
+    t = a^b
+    return t^c,(a&b)|(t&c)
+
+def _step_words(x,mask):
+    '''Advance packed boards by 1 step. Neighbors are counted with
+    bitwise adders so all 64 cells in a word are handled at once.
+
+    '''
+    # west/east neighbors, carrying bits across word boundaries
+    w = x<<_ONE
+    w[:,:,1:] |= x[:,:,:-1]>>_TOP
+    e = x>>_ONE
+    e[:,:,:-1] |= x[:,:,1:]<<_TOP
+
+    # rows above (north) and below (south), off board rows are DEAD
+    def north(a):
+        out = np.zeros_like(a)
+        out[:,1:] = a[:,:-1]
+        return out
+    def south(a):
+        out = np.zeros_like(a)
+        out[:,:-1] = a[:,1:]
+        return out
+
+    # add up the 8 neighbor bits, counts of 8 wrap to 0 which is fine
+    # since both mean the cell is DEAD next step
+    (s1,c1) = _full_adder(north(w),north(x),north(e))
+    (s2,c2) = _full_adder(w,e,south(w))
+    s3 = south(x)^south(e)
+    c3 = south(x)&south(e)
+    (ones,c4) = _full_adder(s1,s2,s3)
+    (twos,d1) = _full_adder(c1,c2,c3)
+    d2 = twos&c4
+    twos ^= c4
+    fours = d1^d2
+
+    # alive with exactly 3 neighbors or 2 neighbors and already alive
+    return twos & ~fours & (ones|x) & mask
+
+
+class PackedConwayBoardBatch:
+    '''Bit-packed stack of Conway boards, each row is stored as uint64
+    words so a 20x20 board takes 160 bytes instead of 3.2 KB and each
+    step handles 64 cells per bitwise operation.
+
+    boards property converts to and from the usual board ndarrays.
+
+    usage:
+    >>> batch = PackedConwayBoardBatch(boards=[e.start_board.board for e in examples])
+    >>> batch.advance(steps=5)
+    >>> batch.boards # num_boards x num_rows x num_cols array of ALIVE and DEAD
+    '''
+
+    def __init__(self,num_boards=0,rows=0,cols=0,boards=None):
+        ''' Construct num_boards all dead boards of size rows x cols or initialize from a stack of boards. '''
+        if boards is None:
+            boards = np.empty([num_boards,rows,cols],dtype=int)
+            boards[...] = DEAD
+        self.boards = boards
+
+    @property
+    def boards(self):
+        ''' Unpacked copy of the boards. '''
+        return unpack_boards(self.words,self.num_cols)
+
+    @boards.setter
+    def boards(self,boards):
+        boards = np.asarray(boards)
+        if boards.ndim!=3:
+            raise ValueError('boards must be a stack of 2d boards, got shape '+str(boards.shape))
+        (self.num_boards,self.num_rows,self.num_cols) = boards.shape
+        self.words = pack_boards(boards)
+        # bits past the last column must stay DEAD
+        self._mask = pack_boards(np.ones([1,1,self.num_cols],dtype=int)*ALIVE)[0]
+
+    def __len__(self):
+        return self.num_boards
+
+    def __getitem__(self,index):
+        ''' ConwayBoard copy of a single board. '''
+        return ConwayBoard(board=unpack_boards(self.words[index:index+1],self.num_cols)[0])
+
+    def advance(self,steps=1):
+        ''' Advance all boards by steps using Conway's Game of Life rules. '''
+        for i in range(steps):
+            if not self.words.any():
+                break
+            self.words = _step_words(self.words,self._mask)
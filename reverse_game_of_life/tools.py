@@ -1,31 +1,108 @@
 # utility methods
 
-from random import choice
+import multiprocessing
 import numpy as np
 
 from .conway_board import DEAD,ALIVE
 
-def bootstrap_confidence_interval(a,f=lambda x:x.mean(),num_replicates=1000,alpha=0.05):
+def bootstrap_confidence_interval(a,f=None,num_replicates=1000,alpha=0.05,seed=None,max_chunk_size=2**22):
     ''' Empirical confidence interval for a statistic using the bootstrap.
     
     See http://en.wikipedia.org/wiki/Bootstrapping_(statistics) for details of the method.
 
     a - sample data to resample from
     f - function to calculate statistic on an np.array of samples, default: mean
+        (the default computes the means of all replicates at once)
     num_replicates - number of bootstrap replicates to create: default: 1000
     alpha - alpha from hypothesis testing to control the confidence interval width
+    seed - int or np.random.Generator for reproducible intervals
+    max_chunk_size - max number of resampled values held in memory at once
 
     returns - (1-alpha)% confidence interval for the statistic
     
     '''
-    # iterable to perform a resamples and calculation of the statistics
-    iterable = (f(np.random.choice(a,size=len(a))) for i in range(num_replicates))
-    # store in np.array
-    d = np.fromiter(iterable,np.float,count=num_replicates)
+    a = np.asarray(a)
+    rng = np.random.default_rng(seed)
+    d = np.empty(num_replicates,dtype=float)
+    # resample indices for many replicates at once, (replicates x len(a))
+    # matrices limited to max_chunk_size entries
+    chunk_size = max(1,min(num_replicates,max_chunk_size//max(1,len(a))))
+    for start in range(0,num_replicates,chunk_size):
+        stop = min(num_replicates,start+chunk_size)
+        samples = a[rng.integers(0,len(a),size=(stop-start,len(a)))]
+        if f is None:
+            d[start:stop] = samples.mean(axis=1)
+        else:
+            d[start:stop] = [f(sample) for sample in samples]
     # in place sort
     np.ndarray.sort(d)
     # return the alpha/2 and 1-alpha/2 quantiles for the confidence interval
-    return d[int(num_replicates*alpha/2)],d[int(num_replicates*(1-alpha/2))]
+    return d[int(num_replicates*alpha/2)],d[min(num_replicates-1,int(num_replicates*(1-alpha/2)))]
+
+
+class RunningStats:
+    '''Streaming count, mean and variance (Welford's method), updated a
+    batch of values at a time. Accumulators from separate workers can
+    be merged.
+
+    keep_values - also keep the values, e.g. for bootstrap_confidence_interval
+
+    usage:
+    >>> stats = RunningStats()
+    >>> stats.update(error_rates)
+    >>> stats.merge(other_stats)
+    >>> (stats.count,stats.mean,stats.variance)
+    '''
+
+    def __init__(self,keep_values=False):
+        self.count = 0
+        self.mean = 0.0
+        # sum of squared differences from the mean
+        self._m2 = 0.0
+        self.keep_values = keep_values
+        self._values = []
+
+    def _combine(self,count,mean,m2):
+        ''' Add the stats of another set of values (Chan et al.'s pairwise update). '''
+        if count==0:
+            return
+        total = self.count+count
+        diff = mean-self.mean
+        self.mean += diff*count/total
+        self._m2 += m2+diff*diff*self.count*count/total
+        self.count = total
+
+    def update(self,values):
+        ''' Add an array of values. '''
+        values = np.asarray(values,dtype=float).ravel()
+        if len(values)==0:
+            return
+        mean = values.mean()
+        self._combine(len(values),mean,((values-mean)**2).sum())
+        if self.keep_values:
+            self._values.append(values)
+
+    def merge(self,other):
+        ''' Add the values accumulated by other. '''
+        self._combine(other.count,other.mean,other._m2)
+        if self.keep_values:
+            self._values.extend(other._values)
+
+    @property
+    def variance(self):
+        ''' Population variance of the values. '''
+        if self.count==0:
+            return 0.0
+        return self._m2/self.count
+
+    @property
+    def values(self):
+        ''' All values added, only available with keep_values. '''
+        if not self.keep_values:
+            raise RuntimeError('RunningStats values are only kept with keep_values=True')
+        if len(self._values)==0:
+            return np.empty(0)
+        return np.concatenate(self._values)
 
 
 def board_to_int(board):
@@ -85,3 +162,98 @@ def inverse_transform(transform):
         raise ValueError('inverse_transform only accepts ints between 0 and 7 (inclusive)')
     
     return _inverse_transform[transform]
+
+def transform_boards(boards,transform=0):
+    '''
+    Transforms a stack of boards (the last 2 axes) to one of the 8 possible rotations/flips, same transforms as transform_board.
+    '''
+    if transform<0 or transform>7:
+        raise ValueError('transform_boards only accepts transformations between 0 and 7 (inclusive)')
+
+    if transform==0:
+        return boards
+    elif transform>=4:
+        return np.rot90(np.flip(boards,axis=-1),transform%4,axes=(-2,-1))
+    else:
+        return np.rot90(boards,transform%4,axes=(-2,-1))
+
+def canonicalize_boards(boards):
+    '''Canonical representative of each board in a stack under the 8
+    rotations/flips, the transform that comes first in row-major
+    lexicographic order. Boards equal up to symmetry have the same
+    representative. Returns (canonical boards,transform applied to
+    each board).
+
+    '''
+    boards = np.asarray(boards)
+    num_boards = len(boards)
+    rows = np.arange(num_boards)
+    best = boards.copy()
+    transforms = np.zeros(num_boards,dtype=int)
+    for t in range(1,8):
+        candidate = transform_boards(boards,t)
+        if candidate.shape!=boards.shape:
+            # non-square boards only have 4 symmetries
+            continue
+        c = candidate.reshape(num_boards,-1)
+        b = best.reshape(num_boards,-1)
+        # compare at the first position they differ
+        differ = c!=b
+        first = differ.argmax(axis=1)
+        smaller = differ[rows,first] & (c[rows,first]<b[rows,first])
+        best[smaller] = candidate[smaller]
+        transforms[smaller] = t
+    return (best,transforms)
+
+
+def effective_n_jobs(n_jobs):
+    '''Number of processes to use for n_jobs, negative values count back
+    from the number of cpus (-1 is all cpus) like scikit-learn.
+
+    '''
+    if n_jobs is None or n_jobs==0:
+        return 1
+    if n_jobs<0:
+        return max(1,multiprocessing.cpu_count()+1+n_jobs)
+    return n_jobs
+
+# object shared with parallel_map workers, set before the pool forks so
+# workers inherit it copy-on-write instead of it being pickled
+_shared = None
+
+def _set_shared(shared):
+    global _shared
+    _shared = shared
+
+def get_shared():
+    ''' The shared object of the parallel_map call running the current task. '''
+    return _shared
+
+def parallel_map(func,items,n_jobs=1,shared=None):
+    '''Returns [func(item) for item in items] computed by a pool of n_jobs
+    processes. func must be a module level function so it can be sent
+    to the workers.
+
+    shared - object func can get with get_shared(), e.g. a trained
+    classifier. Workers are forked where the platform allows, so it is
+    shared copy-on-write rather than pickled with every item.
+
+    '''
+    n_jobs = min(effective_n_jobs(n_jobs),len(items))
+    previous = get_shared()
+    _set_shared(shared)
+    try:
+        if n_jobs<=1:
+            return [func(item) for item in items]
+        if 'fork' in multiprocessing.get_all_start_methods():
+            pool = multiprocessing.get_context('fork').Pool(n_jobs)
+        else:
+            # no fork, shared is pickled once per worker
+            pool = multiprocessing.Pool(n_jobs,initializer=_set_shared,initargs=(shared,))
+        try:
+            return pool.map(func,items)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _set_shared(previous)
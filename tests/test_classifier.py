@@ -25,6 +25,28 @@ class ClassifierTestCase(unittest.TestCase):
     def test_test(self):
         examples = [KaggleExample(delta=1,start_board=[[0,1,1],[1,1,0],[0,0,1]])]
         self.assertAlmostEqual(self.classifier.test(examples), 5./9)
+
+    def test_test_stream(self):
+        # generators are only iterated once
+        examples = (KaggleExample(delta=d,start_board=[[0,1,1],[1,1,0],[0,0,1]]) for d in [1,2])
+        self.assertAlmostEqual(self.classifier.test(examples,detailed_output=True), 5./9)
+
+    def test_test_n_jobs(self):
+        examples = ExampleSet.create(num_examples=30,deltas=[1,2],seed=0)
+        self.assertAlmostEqual(self.classifier.test(examples,n_jobs=3),self.classifier.test(examples))
+        self.assertAlmostEqual(self.classifier.test(list(examples),n_jobs=2,detailed_output=True),self.classifier.test(examples))
+
+    def test_test_bootstrap(self):
+        examples = ExampleSet.create(num_examples=30,deltas=[1,2],seed=0)
+        expected = np.mean([e.evaluate(np.zeros((20,20))) for e in examples])
+        self.assertAlmostEqual(self.classifier.test(examples,detailed_output=True,conf_int_method='bootstrap'),expected)
+        self.assertRaises(ValueError,self.classifier.test,examples,detailed_output=True,conf_int_method='unknown')
+
+    def test_predict_batch(self):
+        examples = ExampleSet.create(num_examples=6,deltas=[1,2],seed=0)
+        received = self.classifier.predict_batch(examples.end_boards,examples.deltas)
+        self.assert_array_equal(received,np.zeros((6,20,20)))
+        self.assert_array_equal(self.classifier.predict_examples(list(examples)),np.zeros((6,20,20)))
         
 
         
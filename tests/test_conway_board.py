@@ -71,3 +71,83 @@ class ConwayBoardTestCase(unittest.TestCase):
         b2 = ConwayBoard(board=start)
         b1.advance()
         self.assertFalse(np.array_equal(b1.board,b2.board),"ConwayBoards share common array.")
+
+    def test_advance_methods(self):
+        ''' Rule table methods agree with census. '''
+        start = [[1,1,1],[1,1,1],[1,1,1]]
+        end = [[1,0,1],[0,0,0],[1,0,1]]
+        for method in ['census','lut3x3','lut4x4']:
+            b = ConwayBoard(board=start)
+            b.advance(method=method)
+            self.assert_array_equal(b.board,end)
+        self.assertRaises(ValueError,ConwayBoard(board=start).advance,method='unknown')
+
+
+class ConwayBoardBatchTestCase(unittest.TestCase):
+    ''' Test ConwayBoardBatch class and advance_many. '''
+
+    def assert_array_equal(self, a1, a2):        
+        self.assertTrue(np.array_equal(a1,a2),repr(a1) + " != " + repr(a2))
+
+    def test_constructor_blank(self):
+        ''' Dead boards constructor. '''
+        batch = ConwayBoardBatch(num_boards=2,rows=3,cols=4)
+        self.assertEqual(len(batch),2)
+        self.assert_array_equal(batch.boards,np.zeros([2,3,4]))
+
+    def test_advance_matches_conway_board(self):
+        ''' Batch advance agrees with advancing each ConwayBoard separately. '''
+        boards = (np.random.rand(10,8,9)<0.4).astype(int)
+        batch = ConwayBoardBatch(boards=boards)
+        batch.advance(steps=3)
+        for i in range(len(boards)):
+            b = ConwayBoard(board=boards[i])
+            for step in range(3):
+                b.advance()
+            self.assert_array_equal(batch.boards[i],b.board)
+            self.assert_array_equal(batch[i].board,b.board)
+
+    def test_advance_methods(self):
+        ''' Rule table methods agree with census for odd and even board sizes. '''
+        for shape in [(5,20,20),(5,7,9),(5,1,1)]:
+            boards = (np.random.rand(*shape)<0.4).astype(int)
+            expected = advance_many(boards,steps=4)
+            for method in ['lut3x3','lut4x4']:
+                self.assert_array_equal(advance_many(boards,steps=4,method=method),expected)
+
+    def test_detect_cycles(self):
+        ''' Settled boards are skipped but end up in the same state. '''
+        boards = (np.random.rand(50,6,6)<0.4).astype(int)
+        # all dead, still life (block), period 2 (blinker)
+        boards[0] = DEAD
+        boards[1] = [[0,0,0,0,0,0],[0,1,1,0,0,0],[0,1,1,0,0,0],[0,0,0,0,0,0],[0,0,0,0,0,0],[0,0,0,0,0,0]]
+        boards[2] = [[0,0,0,0,0,0],[0,0,0,0,0,0],[0,1,1,1,0,0],[0,0,0,0,0,0],[0,0,0,0,0,0],[0,0,0,0,0,0]]
+        batch = ConwayBoardBatch(boards=boards,detect_cycles=True)
+        steps = 0
+        for s in [1,1,2,3,10,1,101]:
+            batch.advance(s)
+            steps += s
+            self.assert_array_equal(batch.boards,advance_many(boards,steps=steps))
+        self.assertEqual(list(batch.periods[0:3]),[1,1,2])
+
+    def test_detect_period_3(self):
+        ''' Pulsar has period 3. '''
+        pulsar = np.zeros([17,17],dtype=int)
+        for i in [2,7,9,14]:
+            for j in [4,5,6,10,11,12]:
+                pulsar[i,j] = ALIVE
+                pulsar[j,i] = ALIVE
+        batch = ConwayBoardBatch(boards=[pulsar],detect_cycles=True)
+        batch.advance(100)
+        self.assertEqual(batch.periods[0],3)
+        self.assert_array_equal(batch.boards,advance_many([pulsar],steps=100))
+        b = ConwayBoard(board=pulsar)
+        b.advance(steps=101)
+        self.assert_array_equal(b.board,advance_many([pulsar],steps=101)[0])
+
+    def test_advance_many(self):
+        ''' Blinker has period 2 and advance_many leaves its input alone. '''
+        blinker = np.array([[[0,0,0],[1,1,1],[0,0,0]]])
+        self.assert_array_equal(advance_many(blinker,steps=1),[[[0,1,0],[0,1,0],[0,1,0]]])
+        self.assert_array_equal(advance_many(blinker,steps=2),blinker)
+        self.assert_array_equal(blinker,[[[0,0,0],[1,1,1],[0,0,0]]])
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from reverse_game_of_life import *
+
+class ExampleSetTestCase(unittest.TestCase):
+    ''' Test ExampleSet. '''
+
+    def assert_array_equal(self, a1, a2):
+        self.assertTrue(np.array_equal(a1,a2),repr(a1) + " != " + repr(a2))
+
+    def setUp(self):
+        self.examples = ExampleSet.create(num_examples=20,deltas=[1,2,3],seed=1)
+
+    def test_constructor(self):
+        examples = ExampleSet([1,2],start_boards=[[[1,1],[1,1]],[[0,1],[0,0]]],ids=[4,5])
+        self.assertEqual(len(examples),2)
+        self.assertEqual(examples.end_boards.dtype,np.uint8)
+        self.assert_array_equal(examples.end_boards,[[[1,1],[1,1]],[[0,0],[0,0]]])
+        self.assertRaises(ValueError,ExampleSet,[1])
+
+    def test_from_examples(self):
+        kaggle_examples = create_examples(num_examples=5,deltas=[1,2])
+        examples = as_example_set(kaggle_examples)
+        self.assertEqual(len(examples),5)
+        self.assertTrue(as_example_set(examples) is examples)
+        for (example,kaggle_example) in zip(examples,kaggle_examples):
+            self.assertEqual(example.delta,kaggle_example.delta)
+            self.assert_array_equal(example.start_board.board,kaggle_example.start_board.board)
+            self.assert_array_equal(example.end_board.board,kaggle_example.end_board.board)
+
+        # test set without start boards
+        examples = as_example_set([KaggleExample(delta=1,end_board=[[1,0],[0,1]],kaggle_id=3)])
+        self.assertTrue(examples.start_boards is None)
+        self.assertEqual(examples[0].kaggle_id,3)
+        self.assertTrue(examples[0].start_board is None)
+
+    def test_getitem(self):
+        example = self.examples[3]
+        self.assertEqual(example.delta,self.examples.deltas[3])
+        self.assert_array_equal(example.end_board.board,self.examples.end_boards[3])
+        self.assert_array_equal(self.examples[-1].end_board.board,self.examples.end_boards[19])
+
+        view = self.examples[5:10]
+        self.assertEqual(len(view),5)
+        self.assertTrue(np.shares_memory(view.end_boards,self.examples.end_boards))
+        self.assert_array_equal(view.start_boards,self.examples.start_boards[5:10])
+        self.assert_array_equal(view[1:3].deltas,self.examples.deltas[6:8])
+        self.assert_array_equal(self.examples[[4,2]].deltas,self.examples.deltas[[4,2]])
+
+    def test_for_delta(self):
+        self.assertEqual(self.examples.unique_deltas(),[1,2,3])
+        total = 0
+        for delta in (1,2,3):
+            view = self.examples.for_delta(delta)
+            self.assertTrue(view is self.examples.for_delta(delta))
+            self.assertTrue((view.deltas==delta).all())
+            total += len(view)
+            # start boards still match end boards
+            self.assert_array_equal(advance_many(view.start_boards,steps=delta),view.end_boards)
+        self.assertEqual(total,len(self.examples))
+
+    def test_shuffle(self):
+        shuffled = self.examples.shuffle(seed=2)
+        self.assertEqual(len(shuffled),len(self.examples))
+        self.assert_array_equal(np.sort(shuffled.deltas),np.sort(self.examples.deltas))
+        self.assert_array_equal(shuffled.end_boards,self.examples.shuffle(seed=2).end_boards)
+        # shuffled views keep the examples together
+        self.assert_array_equal(advance_many(shuffled.for_delta(2).start_boards,steps=2),shuffled.for_delta(2).end_boards)
+
+    def test_load_and_save(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory,'test.csv')
+            with open(file_name,'w') as f:
+                f.write('id,delta,'+','.join(['stop.'+str(i+1) for i in range(4)])+'\n')
+                f.write('1,2,1,1,1,1\n')
+                f.write('7,5,0,0,0,1\n')
+            examples = ExampleSet.load(file_name,num_rows=2,num_cols=2)
+            self.assertTrue(examples.start_boards is None)
+            self.assert_array_equal(examples.ids,[1,7])
+
+            submission = os.path.join(directory,'submission.csv')
+            save_examples(submission,examples,examples.end_boards)
+            with open(submission) as f:
+                self.assertEqual(f.read().split(),['id,start.1,start.2,start.3,start.4','1,1,1,1,1','7,0,0,0,1'])
+
+            # sets without ids are saved like a list of examples without kaggle_id
+            examples = ExampleSet([1,2],end_boards=[[[1,1],[1,1]],[[0,1],[0,0]]])
+            save_examples(submission,examples,examples.end_boards)
+            with open(submission) as f:
+                saved = f.read()
+            save_examples(submission,list(examples),examples.end_boards)
+            with open(submission) as f:
+                self.assertEqual(saved,f.read())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_training_data(self):
+        # same training data from an ExampleSet and a list of KaggleExample
+        classifier = LocalClassifier(window_size=1,off_board_value=-1)
+        examples = self.examples.for_delta(1)
+        (x,y) = classifier.make_training_data(examples,use_transformations=True)
+        (list_x,list_y) = classifier.make_training_data(list(examples),use_transformations=True)
+        self.assert_array_equal(x,list_x)
+        self.assert_array_equal(y,list_y)
+
+        classifier.train(self.examples)
+        self.assertEqual(sorted(classifier.classifiers.keys()),[1,2,3])
+        classifier.test(self.examples)
@@ -0,0 +1,31 @@
+import numpy as np
+import unittest
+
+from reverse_game_of_life import *
+
+class HashLifeTestCase(unittest.TestCase):
+    ''' Test HashLife engine. '''
+
+    def assert_array_equal(self, a1, a2):        
+        self.assertTrue(np.array_equal(a1,a2),repr(a1) + " != " + repr(a2))
+
+    def setUp(self):
+        self.hashlife = HashLife()
+
+    def test_advance_overcrowding(self):
+        ''' More than 3 neighbors dies, off board cells stay dead. '''
+        self.assert_array_equal(self.hashlife.advance([[1,1,1],[1,1,1],[1,1,1]],steps=1),[[1,0,1],[0,0,0],[1,0,1]])
+
+    def test_advance_matches_conway_board(self):
+        ''' Same results as step by step advance for odd sizes and step counts. '''
+        for shape in [(20,20),(5,7),(1,1),(33,17)]:
+            boards = (np.random.rand(3,shape[0],shape[1])<0.4).astype(int)
+            for steps in [0,1,2,5,8,13]:
+                self.assert_array_equal(self.hashlife.advance_many(boards,steps=steps),advance_many(boards,steps=steps))
+
+    def test_advance_long_jump(self):
+        ''' Blinker still oscillating after many steps. '''
+        board = np.zeros([6,6],dtype=int)
+        board[2,1:4] = ALIVE
+        self.assert_array_equal(self.hashlife.advance(board,steps=10**6),board)
+        self.assert_array_equal(self.hashlife.advance(board,steps=10**6+1),board.T)
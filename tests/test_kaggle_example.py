@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 
@@ -27,9 +30,116 @@ class KaggleExampleTestCase(unittest.TestCase):
         self.assertAlmostEqual(e.evaluate(start_board),0)
         self.assertAlmostEqual(e.evaluate(end_board),3.0/9)
 
+    def test_error_rates(self):
+        start_boards = np.array([[[0,1,0],[1,1,0],[0,1,1]],[[1,1,0],[1,0,0],[1,1,1]]])
+        predicted_boards = np.zeros(start_boards.shape,dtype=int)
+        self.assert_array_equal(error_rates(predicted_boards,start_boards),[5.0/9,6.0/9])
+        self.assert_array_equal(error_rates(start_boards,start_boards),[0,0])
+        self.assert_array_equal(error_rates(start_boards[::-1],start_boards),[3.0/9,3.0/9])
+
 
 
     def test_create_examples(self):
         examples = create_examples(num_examples=1,deltas=[1])
         self.assertEqual(len(examples),1)
         self.assertEqual(examples[0].delta,1)
+
+    def test_create_examples_end_boards(self):
+        examples = create_examples(num_examples=20,deltas=[1,3])
+        self.assertEqual(len(examples),20)
+        for e in examples:
+            self.assertTrue(e.delta in [1,3])
+            # end board is the start board advanced delta steps
+            b = ConwayBoard(board=e.start_board.board)
+            for i in range(e.delta):
+                b.advance()
+            self.assert_array_equal(e.end_board.board,b.board)
+            self.assertTrue((e.end_board.board==ALIVE).any())
+
+    def test_create_examples_seed(self):
+        examples1 = create_examples(num_examples=10,seed=42)
+        examples2 = create_examples(num_examples=10,seed=42)
+        for (e1,e2) in zip(examples1,examples2):
+            self.assertEqual(e1.delta,e2.delta)
+            self.assert_array_equal(e1.start_board.board,e2.start_board.board)
+            self.assert_array_equal(e1.end_board.board,e2.end_board.board)
+
+    def test_create_example_arrays(self):
+        (deltas,start_boards,end_boards) = create_example_arrays(num_examples=25,deltas=[2,4],num_rows=6,num_cols=7,seed=1,batch_size=10)
+        self.assertEqual(deltas.shape,(25,))
+        self.assertEqual(start_boards.shape,(25,6,7))
+        self.assertEqual(end_boards.shape,(25,6,7))
+        self.assertTrue(set(deltas)<=set([2,4]))
+        for (delta,start_board,end_board) in zip(deltas,start_boards,end_boards):
+            self.assert_array_equal(end_board,advance_many([start_board],steps=delta)[0])
+            self.assertTrue((end_board==ALIVE).any())
+
+    def test_create_examples_n_jobs(self):
+        (deltas1,start_boards1,end_boards1) = create_example_arrays(num_examples=21,seed=3,n_jobs=2)
+        (deltas2,start_boards2,end_boards2) = create_example_arrays(num_examples=21,seed=3,n_jobs=2)
+        self.assertEqual(len(deltas1),21)
+        self.assert_array_equal(deltas1,deltas2)
+        self.assert_array_equal(start_boards1,start_boards2)
+        self.assert_array_equal(end_boards1,end_boards2)
+        self.assertEqual(len(create_examples(num_examples=5,n_jobs=2)),5)
+
+    def test_iter_example_arrays(self):
+        chunks = list(iter_example_arrays(chunk_size=4,num_examples=10,deltas=[2],seed=5))
+        self.assertEqual([len(deltas) for (deltas,start_boards,end_boards) in chunks],[4,4,2])
+        self.assertTrue(all([(deltas==2).all() for (deltas,start_boards,end_boards) in chunks]))
+        # shards are reproducible and differ between workers
+        shard0 = next(iter_example_arrays(chunk_size=3,seed=5,worker_index=0,num_workers=2))
+        shard1 = next(iter_example_arrays(chunk_size=3,seed=5,worker_index=1,num_workers=2))
+        self.assert_array_equal(shard0[1],next(iter_example_arrays(chunk_size=3,seed=5,worker_index=0,num_workers=2))[1])
+        self.assertFalse(np.array_equal(shard0[1],shard1[1]))
+
+    def test_iter_examples(self):
+        examples = list(iter_examples(num_examples=7,chunk_size=3,deltas=[1]))
+        self.assertEqual(len(examples),7)
+        self.assertEqual(examples[0].delta,1)
+
+    def test_load_examples(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory,'train.csv')
+            with open(file_name,'w') as f:
+                f.write('id,delta,'+','.join(['start.'+str(i+1) for i in range(4)])+','+','.join(['stop.'+str(i+1) for i in range(4)])+'\n')
+                f.write('1,2,0,1,1,0,1,1,1,1\n')
+                f.write('7,5,1,0,0,0,0,0,0,1\n')
+            for i in range(2):
+                # second time through reads the cache
+                (ids,deltas,start_boards,end_boards) = load_example_arrays(file_name,num_rows=2,num_cols=2)
+                self.assert_array_equal(ids,[1,7])
+                self.assert_array_equal(deltas,[2,5])
+                self.assert_array_equal(start_boards,[[[0,1],[1,0]],[[1,0],[0,0]]])
+                self.assert_array_equal(end_boards,[[[1,1],[1,1]],[[0,0],[0,1]]])
+                self.assertTrue(os.path.exists(file_name+'.npz'))
+            # no temporary files left behind
+            self.assertEqual(sorted(os.listdir(directory)),['train.csv','train.csv.npz'])
+
+            # a truncated cache is ignored and rewritten
+            with open(file_name+'.npz','r+b') as f:
+                f.truncate(10)
+            for i in range(2):
+                (ids,deltas,start_boards,end_boards) = load_example_arrays(file_name,num_rows=2,num_cols=2)
+                self.assert_array_equal(ids,[1,7])
+                self.assert_array_equal(end_boards,[[[1,1],[1,1]],[[0,0],[0,1]]])
+
+            examples = load_examples(file_name,num_rows=2,num_cols=2)
+            self.assertEqual(examples[1].kaggle_id,7)
+            self.assertEqual(examples[1].delta,5)
+            self.assert_array_equal(examples[1].end_board.board,[[0,0],[0,1]])
+
+            # header only, no examples
+            file_name = os.path.join(directory,'empty.csv')
+            with open(file_name,'w') as f:
+                f.write('id,delta,'+','.join(['stop.'+str(i+1) for i in range(4)])+'\n')
+            for i in range(2):
+                (ids,deltas,start_boards,end_boards) = load_example_arrays(file_name,num_rows=2,num_cols=2)
+                self.assertEqual(len(ids),0)
+                self.assertEqual(len(deltas),0)
+                self.assertTrue(start_boards is None)
+                self.assertEqual(end_boards.shape,(0,2,2))
+            self.assertEqual(load_examples(file_name,num_rows=2,num_cols=2),[])
+        finally:
+            shutil.rmtree(directory)
@@ -1,7 +1,13 @@
+import os
+import pickle
+import shutil
+import tempfile
 import numpy as np
 import unittest
 
 from reverse_game_of_life import *
+from reverse_game_of_life.tools import inverse_transform,transform_board,transform_boards
+from sklearn.ensemble import RandomForestClassifier
 
 class LocalClassifierTestCase(unittest.TestCase):
     ''' Test LocalClassifier. '''
@@ -76,6 +82,87 @@ class LocalClassifierTestCase(unittest.TestCase):
         self.assertEqual(received,expected)
 
 
+    def test_make_weighted_training_data_counts(self):
+        # same counts as counting (window,label) tuples directly
+        examples = ExampleSet.create(num_examples=5,deltas=[1],seed=0)
+        for (window_size,off_board_value) in ((1,-1),(3,-1),(2,0)):
+            lc = LocalClassifier(window_size=window_size,off_board_value=off_board_value)
+            # group often to also merge groups
+            lc._group_size = 1000
+            (x,y) = lc.make_training_data(examples,use_transformations=True)
+            expected = dict()
+            for (features,label) in zip(x,y):
+                key = (tuple(features),label)
+                expected[key] = expected.get(key,0)+1
+            (x,y,w) = lc.make_weighted_training_data(examples,use_transformations=True)
+            self.assertEqual(len(x),len(expected))
+            self.assertEqual(dict([((tuple(a),b),c) for (a,b,c) in zip(x,y,w)]),expected)
+
+    def test_canonical_windows(self):
+        examples = ExampleSet.create(num_examples=10,deltas=[1],seed=0)
+        lc = LocalClassifier(window_size=1,off_board_value=-1,canonical_windows=True)
+        (x,y,w) = lc.make_weighted_training_data(examples,use_transformations=True)
+        (all_x,all_y,all_w) = self.classifier.make_weighted_training_data(examples,use_transformations=True)
+        # same number of cells in 1/8 of the rows
+        self.assertEqual(w.sum(),all_w.sum()/8)
+        self.assertLess(len(x),len(all_x))
+        for window in x[0:100]:
+            transforms = [tuple(transform_board(window.reshape(3,3),t).flatten()) for t in range(8)]
+            self.assertEqual(min(transforms),tuple(window))
+
+        lc.train(examples)
+        lc.test_use_transforms = True
+        result = lc.predict(examples[0].end_board,1)
+        self.assertEqual(result.shape,(20,20))
+        # symmetric boards give symmetric predictions
+        board = ConwayBoard(board=transform_board(examples[0].end_board.board,3))
+        self.assert_array_equal(lc.predict(board,1),transform_board(result,3))
+
+    def test_feature_dtype(self):
+        examples = ExampleSet.create(num_examples=3,deltas=[1],seed=0)
+        (x,y) = self.classifier.make_training_data(examples)
+        self.assertEqual(x.dtype,np.int8)
+        (x,y,w) = self.classifier.make_weighted_training_data(examples)
+        self.assertEqual(x.dtype,np.int8)
+        self.assertTrue((x==-1).any())
+
+        lc = LocalClassifier(window_size=1,off_board_value=-1,feature_dtype=np.float32)
+        (x32,y32) = lc.make_training_data(examples)
+        self.assertEqual(x32.dtype,np.float32)
+        self.assert_array_equal(x32,self.classifier.make_training_data(examples)[0])
+
+        self.assertRaises(ValueError,LocalClassifier,off_board_value=-1,feature_dtype=np.uint8)
+        self.assertRaises(ValueError,LocalClassifier,off_board_value=1000)
+
+    def test_make_training_shards(self):
+        examples = ExampleSet.create(num_examples=10,deltas=[1],seed=0)
+        directory = tempfile.mkdtemp()
+        try:
+            (x,y) = self.classifier.make_training_data(examples,use_transformations=True)
+            (shard_x,shard_y,shard_w) = self.classifier.make_training_shards(examples,directory,use_transformations=True,use_weights=False,chunk_size=3)
+            self.assertTrue(isinstance(shard_x,np.memmap))
+            self.assertTrue(shard_w is None)
+            self.assert_array_equal(shard_x,x)
+            self.assert_array_equal(shard_y,y)
+
+            # reused for the same examples and settings, rebuilt otherwise
+            modified = os.path.getmtime(os.path.join(directory,'data.x.npy'))
+            self.classifier.make_training_shards(examples,directory,use_transformations=True,use_weights=False)
+            self.assertEqual(os.path.getmtime(os.path.join(directory,'data.x.npy')),modified)
+            (shard_x,shard_y,shard_w) = self.classifier.make_training_shards(examples[0:5],directory,use_transformations=True,use_weights=False)
+            self.assertEqual(len(shard_x),len(x)//2)
+
+            (x,y,w) = self.classifier.make_weighted_training_data(examples)
+            (shard_x,shard_y,shard_w) = self.classifier.make_training_shards(examples,directory,name='weighted')
+            self.assert_array_equal(shard_w,w)
+
+            self.classifier.train(examples,data_dir=directory)
+            self.assertTrue(os.path.exists(os.path.join(directory,'delta1.json')))
+            self.classifier.tune_and_train(examples,[{'n_estimators':[1,2]}],data_dir=directory,seed=0)
+            self.assertTrue(1 in self.classifier.classifiers)
+        finally:
+            shutil.rmtree(directory)
+
     def test_predict(self):
         # classifier repeatability is doable but seems overkill right now
         # so just check that return is sensible and method doesn't error out
@@ -90,7 +177,130 @@ class LocalClassifierTestCase(unittest.TestCase):
         # all 0s or 1s
         self.assertTrue(((result==1) | (result==0)).all())
 
+
+    def test_predict_batch(self):
+        examples = ExampleSet.create(num_examples=20,deltas=[1,2],seed=0)
+        self.assertRaises(ValueError,self.classifier.predict_batch,examples.end_boards,examples.deltas)
+        self.classifier.train(examples)
+        for test_use_transforms in (False,True):
+            self.classifier.test_use_transforms = test_use_transforms
+            received = self.classifier.predict_batch(examples.end_boards,examples.deltas)
+            self.assertEqual(received.shape,(20,20,20))
+            for (i,example) in enumerate(examples):
+                # same as predicting one board at a time
+                x = self.classifier._make_features_board(example.end_board.board)
+                clf = self.classifier.classifiers[example.delta]
+                if not test_use_transforms:
+                    self.assert_array_equal(received[i],clf.predict(x).reshape(20,20))
+                self.assert_array_equal(received[i],self.classifier.predict(example.end_board,example.delta))
         
+    def test_predict_proba_transforms(self):
+        # non-square boards, the transforms give boards of 2 shapes
+        examples = ExampleSet.create(num_examples=10,deltas=[1],num_rows=5,num_cols=7,seed=0)
+        self.classifier.train(examples,use_transformations=True)
+        clf = self.classifier.classifiers[1]
+        boards = examples.end_boards
+        expected = np.zeros(boards.shape)
+        for t in range(8):
+            # one transform at a time
+            transformed = transform_boards(boards,t)
+            y = clf.predict_proba(self.classifier._make_features_boards(transformed))[:,1].reshape(transformed.shape)
+            expected += transform_boards(y,inverse_transform(t))/8
+        self.classifier._group_size = 100
+        self.assertTrue(np.allclose(self.classifier._predict_proba_transforms(boards,1,list(range(8))),expected))
+
+    def test_window_cache(self):
+        examples = ExampleSet.create(num_examples=30,deltas=[1],seed=0)
+        self.classifier.train(examples[0:10])
+        clf = self.classifier.classifiers[1]
+        for test_use_transforms in (False,True):
+            self.classifier.test_use_transforms = test_use_transforms
+            for window_cache_size in (0,5,2**16):
+                self.classifier.window_cache_size = window_cache_size
+                self.classifier.clear_window_cache()
+                for chunk in (examples[10:20],examples[20:30]):
+                    # same predictions with a cold or warm cache
+                    x = self.classifier._make_features_boards(chunk.end_boards)
+                    if not test_use_transforms:
+                        self.assert_array_equal(self.classifier.predict_batch(chunk.end_boards,chunk.deltas).ravel(),clf.predict(x))
+                    received = self.classifier._predict_windows(x,1,'proba')
+                    self.assertTrue(np.allclose(received,clf.predict_proba(x)[:,1]))
+                for (keys,values,counts) in self.classifier._window_cache.values():
+                    self.assertLessEqual(len(keys),window_cache_size)
+                    self.assert_array_equal(keys,np.sort(keys))
+
+        # retraining drops the cache and pickles are made without it
+        self.assertTrue(len(self.classifier._window_cache)>0)
+        self.assertFalse('_window_cache' in self.classifier.__getstate__())
+        self.classifier.train(examples[0:10])
+        self.assertEqual(self.classifier._window_cache,dict())
+
+    def test_compile(self):
+        examples = ExampleSet.create(num_examples=20,deltas=[1,2],seed=0)
+        # small boards have windows hanging off opposite edges
+        small = ExampleSet.create(num_examples=20,deltas=[1,2],num_rows=2,num_cols=3,seed=1)
+        self.classifier.train(examples)
+        for test_use_transforms in (False,True):
+            self.classifier.test_use_transforms = test_use_transforms
+            self.classifier._compiled_windows = dict()
+            expected = [self.classifier.predict_batch(e.end_boards,e.deltas) for e in (examples,small)]
+            self.classifier.compile()
+            self.assertEqual(set([compiled[0] for compiled in self.classifier._compiled_windows.values()]),set(['table']))
+            for (e,predictions) in zip((examples,small),expected):
+                self.assert_array_equal(self.classifier.predict_batch(e.end_boards,e.deltas),predictions)
+
+        # pickles keep the compiled windows
+        copy = pickle.loads(pickle.dumps(self.classifier))
+        self.assertEqual(sorted(copy._compiled_windows.keys()),sorted(self.classifier._compiled_windows.keys()))
+        self.assert_array_equal(copy.predict_batch(examples.end_boards,examples.deltas),expected[0])
+
+        # classifier changed by hand, old compiled windows must not be used
+        self.classifier.classifiers[1] = self.classifier.classifiers[2]
+        self.classifier.clear_window_cache()
+        self.assertEqual(self.classifier._compiled_windows,dict())
+        at_delta = examples.deltas==1
+        self.assert_array_equal(self.classifier.predict_batch(examples.end_boards[at_delta],examples.deltas[at_delta]*0+2),
+                                self.classifier.predict_batch(examples.end_boards[at_delta],examples.deltas[at_delta]))
+
+        # windows made a few at a time are the same windows with the same indexes
+        all_windows = []
+        for group_size in (2**20,100):
+            self.classifier._group_size = group_size
+            chunks = list(self.classifier._all_windows())
+            x = np.concatenate([x for (x,indexes) in chunks])
+            indexes = np.concatenate([indexes for (x,indexes) in chunks])
+            self.assertTrue(max([len(x) for (x,indexes) in chunks])<=group_size)
+            self.assert_array_equal(self.classifier._window_indexes(x),indexes)
+            all_windows.append(x[np.argsort(indexes)])
+        self.assert_array_equal(all_windows[0],all_windows[1])
+
+        # too many windows for a table, compile the windows of some examples
+        lc = LocalClassifier(window_size=2,off_board_value=-1,clf=RandomForestClassifier(n_estimators=2,random_state=0))
+        lc.train(examples)
+        self.assertRaises(ValueError,lc.compile)
+        expected = lc.predict_batch(small.end_boards,small.deltas)
+        lc.compile(examples[0:10])
+        self.assertEqual(lc._compiled_windows[(1,'predict')][0],'keys')
+        self.assert_array_equal(lc.predict_batch(small.end_boards,small.deltas),expected)
+        lc.train(examples)
+        self.assertEqual(lc._compiled_windows,dict())
+
+    def test_test_n_jobs(self):
+        examples = ExampleSet.create(num_examples=20,deltas=[1,2],seed=0)
+        self.classifier.train(examples)
+        self.assertAlmostEqual(self.classifier.test(examples,n_jobs=2),self.classifier.test(examples))
+
+    def test_train_n_jobs(self):
+        examples = ExampleSet.create(num_examples=20,deltas=[1,2,3],seed=0)
+        lc = LocalClassifier(window_size=1,off_board_value=-1,clf=RandomForestClassifier(n_estimators=2,n_jobs=3,random_state=0))
+        lc.train(examples,n_jobs=2)
+        self.assertEqual(sorted(lc.classifiers.keys()),[1,2,3])
+        # estimator n_jobs is back to what the base classifier asked for
+        self.assertEqual(lc.classifiers[1].n_jobs,3)
+        predictions = lc.predict_batch(examples.end_boards,examples.deltas)
+        lc.train(examples,n_jobs=1)
+        self.assert_array_equal(lc.predict_batch(examples.end_boards,examples.deltas),predictions)
+
     def test_tune_and_train(self):
         examples = create_examples(num_examples=10,deltas=[1])
         self.classifier.tune_and_train(examples,[{'n_estimators':[1,2]}])      
@@ -100,6 +310,79 @@ class LocalClassifierTestCase(unittest.TestCase):
         self.classifier.tune_and_train(examples,[{'n_estimators':[1,2],'max_depth':[2,3]}])      
 
         self.assertTrue(1 in self.classifier.classifiers)
+
+    def test_tune_and_train_n_jobs(self):
+        examples = ExampleSet.create(num_examples=20,deltas=[1,2],seed=0)
+        lc = LocalClassifier(window_size=1,off_board_value=-1,clf=RandomForestClassifier(random_state=0))
+        param_grid = [{'n_estimators':[1,2],'max_depth':[1,8]}]
+        for use_weights in (True,False):
+            lc.tune_and_train(examples,param_grid,use_weights=use_weights,seed=0)
+            grid_scores = lc.grid_scores
+            lc.tune_and_train(examples,param_grid,use_weights=use_weights,seed=0,n_jobs=2)
+            self.assertEqual(lc.grid_scores,grid_scores)
+            self.assertEqual(sorted(lc.classifiers.keys()),[1,2])
+
+        # accuracy can't be more than 1 below the best
+        lc.tune_and_train(examples,param_grid,seed=0,abandon_margin=1.0)
+        self.assertEqual(len(lc.grid_scores[1]),4)
+        lc.tune_and_train(examples,param_grid,seed=0,abandon_margin=0.0)
+        self.assertGreaterEqual(len(lc.grid_scores[1]),1)
+        self.assertTrue(lc.best_params[1] in [parameters for (score,parameters) in lc.grid_scores[1]])
+
+        # the first pass fits about 1/4 of the weighted tuning data
+        fits = []
+        score_grid_points = lc._score_grid_points
+        def record_fits(points,train_data,test_data,n_jobs=1):
+            fits.append(train_data[2].sum())
+            return score_grid_points(points,train_data,test_data,n_jobs)
+        lc._score_grid_points = record_fits
+        lc.tune_and_train(examples.for_delta(1),param_grid,seed=0,abandon_margin=1.0)
+        self.assertEqual(len(fits),2)
+        self.assertAlmostEqual(fits[0]/fits[1],0.25,delta=0.05)
+
+    def test_tune_and_train_halving(self):
+        examples = ExampleSet.create(num_examples=20,deltas=[1,2],seed=0)
+        lc = LocalClassifier(window_size=1,off_board_value=-1,clf=RandomForestClassifier(random_state=0))
+        param_grid = [{'n_estimators':[1,2,3],'max_depth':[1,2,4,8]}]
+        for use_weights in (True,False):
+            # 12 points on 1/9 of the data, 4 on 1/3 and 2 on all of it
+            lc.tune_and_train(examples,param_grid,use_weights=use_weights,seed=0,search='halving')
+            self.assertEqual(len(lc.grid_scores[1]),2)
+            self.assertEqual(lc.best_scores[1],max([score for (score,parameters) in lc.grid_scores[1]]))
+            self.assertTrue(lc.best_params[2] in [parameters for (score,parameters) in lc.grid_scores[2]])
+            self.assertEqual(sorted(lc.classifiers.keys()),[1,2])
+
+        lc.tune_and_train(examples,param_grid,seed=0,search='halving',halving_factor=12)
+        self.assertEqual(len(lc.grid_scores[1]),12)
+        self.assertRaises(ValueError,lc.tune_and_train,examples,param_grid,search='random')
+        self.assertRaises(ValueError,lc.tune_and_train,examples,param_grid,search='halving',halving_factor=1)
+
+    def test_subset_data(self):
+        examples = ExampleSet.create(num_examples=400,deltas=[1],seed=0)
+        (x,y,w) = self.classifier.make_weighted_training_data(examples)
+        alive = np.dot(y==ALIVE,w)/w.sum()
+        for step in (3,27):
+            (sub_x,sub_y,sub_w) = self.classifier._subset_data((x,y,w),step,seed=0)
+            # about 1/step of the weight, same label balance
+            self.assertAlmostEqual(sub_w.sum()/w.sum(),1.0/step,delta=0.1/step)
+            self.assertAlmostEqual(np.dot(sub_y==ALIVE,sub_w)/sub_w.sum(),alive,delta=0.02)
+            self.assertTrue((sub_w>=1).all())
+            self.assertTrue(len(sub_x)==len(sub_y)==len(sub_w))
+
+        # unweighted data keeps the leading rows, ie the first examples
+        (x,y) = self.classifier.make_training_data(examples)
+        (sub_x,sub_y,sub_w) = self.classifier._subset_data((x,y,None),4)
+        self.assertTrue(sub_w is None)
+        self.assert_array_equal(sub_x,x[0:len(x)//4])
+
+    def test_merge_weighted_data(self):
+        examples = ExampleSet.create(num_examples=10,deltas=[1],seed=0)
+        (x,y,w) = self.classifier._merge_weighted_data(self.classifier.make_weighted_training_data(examples[0:4]),
+                                                       self.classifier.make_weighted_training_data(examples[4:10]))
+        (all_x,all_y,all_w) = self.classifier.make_weighted_training_data(examples)
+        self.assert_array_equal(x,all_x)
+        self.assert_array_equal(y,all_y)
+        self.assert_array_equal(w,all_w)
         
 
 class FreshEnsembleClassifierTestCase(unittest.TestCase):
@@ -122,3 +405,11 @@ class FreshEnsembleClassifierTestCase(unittest.TestCase):
         # all 0s or 1s
         self.assertTrue(((result==1) | (result==0)).all())
 
+    def test_compile(self):
+        examples = ExampleSet.create(num_examples=10,deltas=[1],seed=0)
+        self.classifier.train(num_examples=20,deltas=[1],seed=0)
+        expected = self.classifier.predict_batch(examples.end_boards,examples.deltas)
+        self.classifier.compile()
+        self.assertEqual(self.classifier._compiled_windows[(1,'predict')][0],'table')
+        self.assertTrue(np.array_equal(self.classifier.predict_batch(examples.end_boards,examples.deltas),expected))
+
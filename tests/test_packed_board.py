@@ -0,0 +1,33 @@
+import numpy as np
+import unittest
+
+from reverse_game_of_life import *
+
+class PackedConwayBoardBatchTestCase(unittest.TestCase):
+    ''' Test bit-packed boards. '''
+
+    def assert_array_equal(self, a1, a2):        
+        self.assertTrue(np.array_equal(a1,a2),repr(a1) + " != " + repr(a2))
+
+    def test_pack_round_trip(self):
+        # widths below, at and above a 64 bit word
+        for num_cols in [1,20,64,65,130]:
+            boards = (np.random.rand(3,5,num_cols)<0.5).astype(int)
+            words = pack_boards(boards)
+            self.assertEqual(words.shape,(3,5,(num_cols+63)//64))
+            self.assert_array_equal(unpack_boards(words,num_cols),boards)
+
+    def test_advance_overcrowding(self):
+        ''' More than 3 neighbors dies. '''
+        batch = PackedConwayBoardBatch(boards=[[[1,1,1],[1,1,1],[1,1,1]]])
+        batch.advance()
+        self.assert_array_equal(batch.boards,[[[1,0,1],[0,0,0],[1,0,1]]])
+
+    def test_advance_matches_batch(self):
+        ''' Same result as unpacked advance, including across word boundaries. '''
+        for num_cols in [20,64,100]:
+            boards = (np.random.rand(4,20,num_cols)<0.4).astype(int)
+            packed = PackedConwayBoardBatch(boards=boards)
+            packed.advance(steps=4)
+            self.assert_array_equal(packed.boards,advance_many(boards,steps=4))
+            self.assert_array_equal(packed[1].board,advance_many(boards,steps=4)[1])
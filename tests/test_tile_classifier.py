@@ -29,4 +29,12 @@ class TileClassifierTestCase(unittest.TestCase):
         # all 0s or 1s
         self.assertTrue(((result==1) | (result==0)).all())
 
-        
+    def test_predict_batch(self):
+        examples = ExampleSet.create(num_examples=10,deltas=[1],seed=0)
+        self.classifier.store_tiles(examples)
+
+        received = self.classifier.predict_batch(examples.end_boards,examples.deltas)
+        for (i,example) in enumerate(examples):
+            # same as tile by tile prediction
+            self.assert_array_equal(received[i],self.classifier._predict_board(example.end_board,1))
+        self.assertRaises(ValueError,self.classifier.predict_batch,examples.end_boards,[2]*10)
@@ -18,6 +18,35 @@ class ToolsTestCase(unittest.TestCase):
         (lb,ub) = bootstrap_confidence_interval(a,lambda x:np.median(x))
         self.assertLessEqual(lb,ub)
 
+    def test_bootstrap_confidence_interval_seed(self):
+        a = np.random.randn(100)
+        self.assertEqual(bootstrap_confidence_interval(a,seed=1),bootstrap_confidence_interval(a,seed=1))
+        # smaller chunks of replicates give the same replicates
+        self.assertEqual(bootstrap_confidence_interval(a,seed=1),bootstrap_confidence_interval(a,seed=1,max_chunk_size=1000))
+        (lb,ub) = bootstrap_confidence_interval(a,seed=1,max_chunk_size=1000)
+        self.assertLessEqual(lb,a.mean())
+        self.assertLessEqual(a.mean(),ub)
+
+    def test_running_stats(self):
+        a = np.random.rand(100)
+        stats = RunningStats()
+        for chunk in np.array_split(a,7):
+            stats.update(chunk)
+        self.assertEqual(stats.count,100)
+        self.assertAlmostEqual(stats.mean,a.mean())
+        self.assertAlmostEqual(stats.variance,a.var())
+        self.assertRaises(RuntimeError,lambda:stats.values)
+
+        # merging accumulators from separate workers
+        first = RunningStats(keep_values=True)
+        first.update(a[0:30])
+        second = RunningStats(keep_values=True)
+        second.update(a[30:])
+        first.merge(second)
+        self.assertAlmostEqual(first.mean,a.mean())
+        self.assertAlmostEqual(first.variance,a.var())
+        self.assertTrue(np.array_equal(first.values,a))
+
     def test_board_to_int(self):
         # 010
         # 110
@@ -83,6 +112,26 @@ class ToolsTestCase(unittest.TestCase):
         for t in range(8):
             self.assertTrue(np.array_equal(transform_board(transform_board(board,t),inverse_transform(t)),board), repr(t) + ' and inverse do not combine to identity')
             
+    def test_transform_boards(self):
+        boards = np.random.randint(0,2,size=(5,3,4))
+        for t in range(8):
+            expected = [transform_board(board,t) for board in boards]
+            self.assertTrue(np.array_equal(transform_boards(boards,t),expected))
+        self.assertRaises(ValueError,transform_boards,boards,8)
+        self.assertRaises(ValueError,transform_boards,boards,-1)
+
+    def test_canonicalize_boards(self):
+        board = np.array([[0,0,0],[0,1,1],[1,0,0]])
+        boards = np.array([transform_board(board,t) for t in range(8)])
+        (canonical,transforms) = canonicalize_boards(boards)
+        # same representative for all 8 and it is one of them
+        self.assertTrue((canonical==canonical[0]).all())
+        self.assertTrue(any(np.array_equal(canonical[0],b) for b in boards))
+        for (b,c,t) in zip(boards,canonical,transforms):
+            self.assertTrue(np.array_equal(transform_board(b,t),c))
+        # smallest in row-major order
+        self.assertEqual(min(tuple(b.flatten()) for b in boards),tuple(canonical[0].flatten()))
+
     def test_inverse_transform2(self):
         # 0100
         # 1010
@@ -96,3 +145,22 @@ class ToolsTestCase(unittest.TestCase):
         # applying transform and its inverse should bring back to original board
         for t in range(8):
             self.assertTrue(np.array_equal(transform_board(transform_board(board,t),inverse_transform(t)),board), repr(t) + ' and inverse do not combine to identity')
+
+    def test_effective_n_jobs(self):
+        self.assertEqual(effective_n_jobs(1),1)
+        self.assertEqual(effective_n_jobs(None),1)
+        self.assertEqual(effective_n_jobs(3),3)
+        self.assertGreaterEqual(effective_n_jobs(-1),1)
+
+    def test_parallel_map(self):
+        self.assertEqual(parallel_map(abs,[-1,2,-3],n_jobs=2),[1,2,3])
+        self.assertEqual(parallel_map(abs,[-1,2,-3],n_jobs=1),[1,2,3])
+
+    def test_parallel_map_shared(self):
+        for n_jobs in (1,2):
+            self.assertEqual(parallel_map(_add_shared,[1,2,3],n_jobs=n_jobs,shared=10),[11,12,13])
+        self.assertTrue(get_shared() is None)
+
+
+def _add_shared(x):
+    return x+get_shared()
@@ -11,5 +11,5 @@ from sklearn.ensemble import RandomForestClassifier
 
 lc_rf64_w3_d1_40k = LocalClassifier(window_size=3,off_board_value=-1,clf=RandomForestClassifier(n_estimators=64,bootstrap=False,min_samples_split=256,max_features=20,n_jobs=16))
 # train on 40k examples all for delta=1
-ex_train = create_examples(40000,deltas=[1])
+ex_train = create_examples(40000,deltas=[1],n_jobs=16)
 lc_rf64_w3_d1_40k.train(ex_train,use_transformations=True)